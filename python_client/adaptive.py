@@ -0,0 +1,107 @@
+"""
+Адаптивный размер чанков по измеренной скорости сервера
+Первый чанк короткий, чтобы аудио началось быстрее, следующие растут так,
+чтобы синтез очередного чанка заканчивался чуть раньше, чем доиграет
+предыдущий
+"""
+
+import collections
+from typing import Deque, Dict, Optional, Tuple
+
+# Модель сервера для голоса и языка: (накладные расходы запроса, секунд
+# синтеза на символ, секунд аудио на символ)
+Estimate = Tuple[float, float, float]
+
+
+class ChunkSizer:
+    """
+    Подбирает размер следующего чанка по фактору реального времени
+
+    По последним успешным запросам для каждой пары голос/язык строится
+    линейная модель: время синтеза = накладные расходы + символы * секунд
+    на символ. Следующий чанк берется таким, чтобы он синтезировался за
+    margin от длительности предыдущего.
+    """
+
+    def __init__(
+        self,
+        first_chunk_size: int = 40,
+        min_chunk_size: int = 20,
+        max_chunk_size: int = 400,
+        margin: float = 0.8,
+        window: int = 50
+    ):
+        self.first_chunk_size = first_chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.margin = margin
+        self._window = window
+        # (голос, язык) -> последние замеры (символы, время синтеза, длительность аудио)
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[int, float, float]]] = {}
+
+    def record(self, voice: str, language: str, chars: int, elapsed: float, audio_seconds: float) -> None:
+        """Учитывает завершенный запрос"""
+        if chars <= 0 or elapsed <= 0 or audio_seconds <= 0:
+            return
+        samples = self._samples.get((voice, language))
+        if samples is None:
+            samples = self._samples[(voice, language)] = collections.deque(maxlen=self._window)
+        samples.append((chars, elapsed, audio_seconds))
+
+    def real_time_factor(self, voice: str, language: str) -> Optional[float]:
+        """Отношение времени синтеза к длительности аудио (меньше 1 - быстрее реального времени)"""
+        samples = self._samples.get((voice, language))
+        if not samples:
+            return None
+        return sum(s[1] for s in samples) / sum(s[2] for s in samples)
+
+    def estimate(self, voice: str, language: str) -> Optional[Estimate]:
+        samples = self._samples.get((voice, language))
+        if not samples:
+            return None
+        count = len(samples)
+        total_chars = sum(s[0] for s in samples)
+        total_elapsed = sum(s[1] for s in samples)
+        audio_per_char = sum(s[2] for s in samples) / total_chars
+
+        # Метод наименьших квадратов по (символы, время); при вырожденных
+        # данных считаем время пропорциональным длине
+        mean_chars = total_chars / count
+        mean_elapsed = total_elapsed / count
+        variance = sum((s[0] - mean_chars) ** 2 for s in samples)
+        if variance > 0:
+            slope = sum((s[0] - mean_chars) * (s[1] - mean_elapsed) for s in samples) / variance
+            overhead = mean_elapsed - slope * mean_chars
+            if slope > 0 and overhead >= 0:
+                return overhead, slope, audio_per_char
+        return 0.0, total_elapsed / total_chars, audio_per_char
+
+    def next_size(self, voice: str, language: str, previous: Optional[int] = None) -> int:
+        """
+        Размер следующего чанка в символах
+
+        Args:
+            previous: Размер предыдущего чанка потока (None - это первый чанк)
+        """
+        if previous is None:
+            return self.first_chunk_size
+
+        estimate = self.estimate(voice, language)
+        if estimate is None:
+            # Замеров еще нет - растем геометрически
+            size = previous * 2
+        else:
+            overhead, seconds_per_char, audio_per_char = estimate
+            if seconds_per_char >= self.margin * audio_per_char:
+                # Сервер не успевает за воспроизведением: паузы неизбежны,
+                # поэтому экономим хотя бы на накладных расходах запросов
+                size = self.max_chunk_size
+            else:
+                # Пока играет предыдущий чанк, должен успеть синтезироваться
+                # следующий. Если накладные расходы не дают успеть, растем
+                # вдвое: с длиной чанка их доля падает
+                budget = self.margin * previous * audio_per_char - overhead
+                size = int(budget / seconds_per_char)
+                if size < previous:
+                    size = previous * 2
+        return max(self.min_chunk_size, min(self.max_chunk_size, size))
@@ -0,0 +1,209 @@
+"""
+Пул серверов AllTalk с маршрутизацией по наименьшему числу активных запросов
+Серверы, не прошедшие /api/ready, исключаются из маршрутизации до восстановления,
+брошенная генерация останавливается через /api/stop-generation
+"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from lazy import lazy_import
+
+aiohttp = lazy_import("aiohttp")
+
+logger = logging.getLogger(__name__)
+
+# Запросы в работе по URL сервера во всех пулах процесса. /api/stop-generation
+# прерывает генерацию сервера целиком, поэтому останавливать ее можно, только
+# когда ни у одного клиента процесса не осталось запросов к этому серверу
+_outstanding: Dict[str, int] = collections.Counter()
+_stopping: Set[str] = set()
+
+
+class Backend:
+    """Один сервер AllTalk и его текущее состояние"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.completed = 0
+        self.failures = 0
+        self.stops = 0
+        # Сглаженная задержка запроса, секунды
+        self.latency: Optional[float] = None
+
+    def __repr__(self) -> str:
+        state = "healthy" if self.healthy else "ejected"
+        return f"Backend({self.url!r}, {state}, outstanding={self.outstanding})"
+
+
+class BackendPool:
+    """Набор серверов с least-outstanding-requests балансировкой"""
+
+    def __init__(self, urls: List[str], health_check_interval: float = 5.0, stop_on_abandon: bool = True):
+        if not urls:
+            raise ValueError("Нужен хотя бы один сервер AllTalk")
+        self.backends = [Backend(url) for url in urls]
+        self.health_check_interval = health_check_interval
+        self.stop_on_abandon = stop_on_abandon
+        self._next = 0
+        self._checker: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Задачи, отмененные без остановки генерации (см. cancel_quietly)
+        self._quiet: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    @property
+    def healthy(self) -> List[Backend]:
+        return [backend for backend in self.backends if backend.healthy]
+
+    def acquire(self) -> Backend:
+        """
+        Выбирает сервер с наименьшим числом активных запросов
+
+        При равенстве выбор идет по кругу. Если исключены все серверы,
+        выбираем среди всех: лучше попытаться, чем отказать сразу.
+        """
+        candidates = self.healthy or self.backends
+        count = len(candidates)
+        start = self._next % count
+        best = None
+        for i in range(count):
+            backend = candidates[(start + i) % count]
+            if best is None or backend.outstanding < best.outstanding:
+                best = backend
+        self._next += 1
+        best.outstanding += 1
+        _outstanding[best.url] += 1
+        return best
+
+    def release(self, backend: Backend, elapsed: Optional[float] = None, failed: bool = False) -> None:
+        """Возвращает сервер в пул и учитывает результат запроса"""
+        self._untrack(backend)
+        if failed:
+            self.report_failure(backend)
+            return
+        backend.completed += 1
+        if elapsed is not None:
+            if backend.latency is None:
+                backend.latency = elapsed
+            else:
+                backend.latency = 0.8 * backend.latency + 0.2 * elapsed
+
+    def report_failure(self, backend: Backend) -> None:
+        """Ошибка запроса - повод проверить сервер, не дожидаясь планового опроса"""
+        backend.failures += 1
+        if self._checker is not None:
+            asyncio.ensure_future(self.check(backend))
+
+    @contextlib.asynccontextmanager
+    async def lease(self) -> AsyncIterator[Backend]:
+        """Контекст запроса к серверу: отказ засчитывается при исключении"""
+        backend = self.acquire()
+        started = time.perf_counter()
+        try:
+            yield backend
+        except (asyncio.CancelledError, GeneratorExit):
+            # Запрос отменил сам клиент - сервер тут ни при чем, но его
+            # генерация больше никому не нужна
+            self._untrack(backend)
+            if asyncio.current_task() not in self._quiet:
+                self._abandoned(backend)
+            raise
+        except BaseException:
+            self.release(backend, failed=True)
+            raise
+        self.release(backend, time.perf_counter() - started)
+
+    def cancel_quietly(self, task: "asyncio.Future") -> None:
+        """
+        Отменяет запрос, не останавливая генерацию на сервере
+
+        Для проигравшего хеджирующего запроса: ответ уже получен с другого
+        сервера, а /api/stop-generation прервал бы и чужую генерацию.
+        """
+        self._quiet.add(task)
+        task.cancel()
+
+    @staticmethod
+    def _untrack(backend: Backend) -> None:
+        backend.outstanding -= 1
+        _outstanding[backend.url] -= 1
+        if not _outstanding[backend.url]:
+            del _outstanding[backend.url]
+
+    def _abandoned(self, backend: Backend) -> None:
+        # Останавливаем, только когда на сервере не осталось запросов ни одного
+        # клиента процесса: /api/stop-generation прерывает генерацию целиком
+        if not self.stop_on_abandon or _outstanding[backend.url] or backend.url in _stopping:
+            return
+        if self._session is None or self._session.closed:
+            return
+        _stopping.add(backend.url)
+        asyncio.ensure_future(self.stop_generation(backend))
+
+    async def stop_generation(self, backend: Backend) -> bool:
+        """Просит сервер прервать текущую генерацию (PUT /api/stop-generation)"""
+        try:
+            async with self._session.put(f"{backend.url}/api/stop-generation") as response:
+                await response.read()
+                stopped = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError):
+            stopped = False
+        finally:
+            _stopping.discard(backend.url)
+        if stopped:
+            backend.stops += 1
+            logger.info(f"🛑 Генерация на {backend.url} остановлена")
+        return stopped
+
+    async def check(self, backend: Backend) -> bool:
+        """Проверяет /api/ready и исключает или возвращает сервер в пул"""
+        if self._session is None:
+            return backend.healthy
+        ready = False
+        try:
+            async with self._session.get(f"{backend.url}/api/ready") as response:
+                if response.status == 200:
+                    ready = (await response.text()).strip().strip('"') == "Ready"
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ready = False
+
+        if ready and not backend.healthy:
+            logger.info(f"✅ Сервер {backend.url} снова в строю")
+        elif not ready and backend.healthy:
+            logger.warning(f"⚠️ Сервер {backend.url} исключен: /api/ready не отвечает")
+        backend.healthy = ready
+        return ready
+
+    async def check_all(self) -> None:
+        """Проверяет все серверы одновременно"""
+        await asyncio.gather(*(self.check(backend) for backend in self.backends))
+
+    def start(self, session: "aiohttp.ClientSession") -> None:
+        """Запускает периодическую проверку серверов через сессию клиента"""
+        self._session = session
+        if len(self.backends) > 1 and self._checker is None:
+            self._checker = asyncio.ensure_future(self._check_loop())
+
+    async def stop(self) -> None:
+        """Останавливает проверки"""
+        if self._checker is not None:
+            self._checker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._checker
+            self._checker = None
+        self._session = None
+
+    async def _check_loop(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.health_check_interval)
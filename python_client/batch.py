@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+📦 Пакетный синтез корпуса текстов в WAV файлы
+Читает манифест JSONL, держит ограниченное число документов в работе,
+пишет аудио на диск по мере прихода и ведет журнал, по которому
+прерванный запуск продолжается с места остановки.
+
+Строка манифеста: {"id": "doc-1", "text": "...", "voice": "...", "language": "...", "output": "doc-1.wav"}
+Обязательны только id и text.
+
+Запуск: python batch.py manifest.jsonl --output-dir audio [--concurrency 4]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set
+
+from cancellation import CancelHandle
+from client import TTSStreamingClient
+
+logger = logging.getLogger(__name__)
+
+# Символы, недопустимые в имени файла, из id документа
+_UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+
+def read_manifest(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Построчно читает манифест, не загружая его в память целиком
+
+    Raises:
+        ValueError: если строка не JSON или в ней нет id и text
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: некорректный JSON: {e}") from None
+            if not isinstance(item, dict) or "id" not in item or "text" not in item:
+                raise ValueError(f"{path}:{number}: в строке манифеста нужны поля id и text")
+            item["id"] = str(item["id"])
+            yield item
+
+
+def read_journal(path: str) -> Set[str]:
+    """id документов, уже записанных в прошлых запусках"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Последняя строка могла оборваться при падении процесса
+                continue
+            if entry.get("status") == "done":
+                done.add(entry["id"])
+    return done
+
+
+class BatchRunner:
+    """
+    Пакетный синтез документов на одном TTSStreamingClient
+
+    Каждый документ режется chunk_text и пишется через generate_tts_to_file
+    во временный файл, который переименовывается только после успеха, -
+    на диске не бывает недописанных WAV под итоговым именем. Запросы идут
+    в планировщик с приоритетом batch и не мешают интерактивным.
+    """
+
+    def __init__(
+        self,
+        client: TTSStreamingClient,
+        output_dir: str,
+        journal_path: Optional[str] = None,
+        concurrency: int = 4,
+        max_chunk_size: Optional[int] = None,
+        chunk_concurrency: Optional[int] = None,
+        tenant: str = "batch"
+    ):
+        """
+        Args:
+            client: Открытый клиент (внутри async with)
+            output_dir: Каталог для WAV файлов
+            journal_path: Журнал выполнения (по умолчанию journal.jsonl в output_dir)
+            concurrency: Сколько документов синтезируется одновременно
+            max_chunk_size: Размер чанка (по умолчанию из конфигурации)
+            chunk_concurrency: Параллельных чанков внутри документа
+            tenant: Арендатор планировщика для запросов пакета
+        """
+        self.client = client
+        self.output_dir = output_dir
+        self.journal_path = journal_path or os.path.join(output_dir, "journal.jsonl")
+        self.concurrency = max(1, concurrency)
+        self.max_chunk_size = max_chunk_size
+        self.chunk_concurrency = chunk_concurrency
+        self.tenant = tenant
+        self.cancel = CancelHandle()
+        self.stats: Dict[str, Any] = {}
+
+    def output_path(self, item: Dict[str, Any]) -> str:
+        name = item.get("output") or _UNSAFE_NAME.sub("_", item["id"]) + ".wav"
+        return os.path.join(self.output_dir, name)
+
+    async def run(self, items) -> Dict[str, Any]:
+        """
+        Синтезирует документы, пропуская записанные в журнале как готовые
+
+        Args:
+            items: Итерируемое или асинхронно итерируемое описаний документов
+
+        Returns:
+            Статистика: документов, ошибок, пропущено, секунд аудио,
+            документов в секунду и секунд аудио в секунду
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        done = read_journal(self.journal_path)
+        self.stats = {
+            "items": 0,
+            "failed": 0,
+            "skipped": 0,
+            "chars": 0,
+            "audio_seconds": 0.0,
+            "elapsed": 0.0,
+            "items_per_second": 0.0,
+            "audio_seconds_per_second": 0.0,
+        }
+        if done:
+            logger.info(f"📒 В журнале уже готово документов: {len(done)}")
+
+        # Ограниченная очередь: манифест читается по мере освобождения воркеров
+        queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=self.concurrency)
+        started = time.perf_counter()
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            workers = [
+                asyncio.create_task(self._worker(queue, journal, started))
+                for _ in range(self.concurrency)
+            ]
+            try:
+                async for item in _aiter(items):
+                    if self.cancel.cancelled:
+                        break
+                    if item["id"] in done:
+                        self.stats["skipped"] += 1
+                        continue
+                    await queue.put(item)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        self._update_rates(started)
+        logger.info(
+            f"📦 Готово документов: {self.stats['items']}, ошибок: {self.stats['failed']}, "
+            f"пропущено: {self.stats['skipped']}, {self.stats['items_per_second']:.2f} док/с, "
+            f"{self.stats['audio_seconds_per_second']:.2f} с аудио/с"
+        )
+        return self.stats
+
+    async def _worker(self, queue: asyncio.Queue, journal, started: float) -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            entry = await self._synthesize(item)
+            # Строка журнала пишется и сбрасывается целиком сразу после документа
+            try:
+                journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                journal.flush()
+            except OSError as e:
+                # Без строки журнала документ повторится при продолжении
+                logger.error(f"❌ Журнал {self.journal_path}: {e}")
+            if entry["status"] == "done":
+                self.stats["items"] += 1
+                self.stats["chars"] += entry["chars"]
+                self.stats["audio_seconds"] += entry["duration"]
+            elif entry["status"] == "failed":
+                self.stats["failed"] += 1
+            elif entry["status"] == "skipped":
+                self.stats["skipped"] += 1
+            self._update_rates(started)
+
+    async def _synthesize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Синтезирует один документ и возвращает строку журнала
+
+        Не бросает исключений (кроме отмены): любая ошибка документа,
+        включая ошибки файловой системы, записывается как failed, чтобы
+        воркер не погиб и run() не ждал вечно свободного воркера.
+        """
+        entry: Dict[str, Any] = {"id": item["id"]}
+        partial = None
+        item_started = time.perf_counter()
+        try:
+            path = self.output_path(item)
+            partial = path + ".part"
+            entry.update(output=path, chars=len(item["text"]))
+            result = await self.client.generate_tts_to_file(
+                item["text"],
+                partial,
+                voice=item.get("voice"),
+                language=item.get("language"),
+                max_chunk_size=self.max_chunk_size,
+                max_concurrency=self.chunk_concurrency,
+                priority="batch",
+                tenant=self.tenant,
+                cancel=self.cancel,
+            )
+            if self.cancel.cancelled:
+                # Прерванный документ не отмечается готовым - повторится при продолжении
+                entry.update(status="cancelled")
+            elif not result["data_bytes"]:
+                # Пустой текст или текст, который нормализация свела к нулю:
+                # WAV без аудио под итоговым именем не оставляем
+                logger.warning(f"⚠️ Документ {item['id']}: нет текста для синтеза")
+                entry.update(status="skipped", error="нет текста для синтеза")
+            else:
+                os.replace(partial, path)
+                entry.update(
+                    status="done",
+                    chunks=result["chunks"],
+                    duration=round(result["duration"], 3),
+                    elapsed=round(time.perf_counter() - item_started, 3),
+                )
+                logger.info(f"💾 {item['id']}: {result['duration']:.1f}с аудио -> {path}")
+        except Exception as e:
+            logger.error(f"❌ Документ {item['id']}: {e}")
+            entry.update(status="failed", error=str(e))
+        finally:
+            if partial is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(partial)
+        return entry
+
+    def _update_rates(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self.stats["elapsed"] = elapsed
+        if elapsed > 0:
+            self.stats["items_per_second"] = self.stats["items"] / elapsed
+            self.stats["audio_seconds_per_second"] = self.stats["audio_seconds"] / elapsed
+
+
+async def _aiter(items) -> AsyncIterator[Dict[str, Any]]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_manifest(
+    manifest: str,
+    output_dir: str,
+    config_file: str = "tts_config.json",
+    journal_path: Optional[str] = None,
+    concurrency: int = 4,
+    max_chunk_size: Optional[int] = None,
+    chunk_concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """Синтезирует манифест JSONL в каталог WAV файлов"""
+    async with TTSStreamingClient(config_file) as client:
+        runner = BatchRunner(
+            client,
+            output_dir,
+            journal_path=journal_path,
+            concurrency=concurrency,
+            max_chunk_size=max_chunk_size,
+            chunk_concurrency=chunk_concurrency,
+        )
+        return await runner.run(read_manifest(manifest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный синтез манифеста JSONL в WAV файлы")
+    parser.add_argument("manifest", help="Файл JSONL: id, text и необязательные voice, language, output")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--config", default="tts_config.json")
+    parser.add_argument("--journal", default=None, help="Журнал для продолжения (по умолчанию в output-dir)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Документов одновременно")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--chunk-concurrency", type=int, default=None, help="Чанков одновременно в документе")
+    parser.add_argument("--stats", default=None, help="Куда записать итоговую статистику JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    # Построчный лог каждого чанка в пакете только мешает
+    logging.getLogger("client").setLevel(logging.WARNING)
+
+    stats = asyncio.run(run_manifest(
+        args.manifest,
+        args.output_dir,
+        config_file=args.config,
+        journal_path=args.journal,
+        concurrency=args.concurrency,
+        max_chunk_size=args.chunk_size,
+        chunk_concurrency=args.chunk_concurrency,
+    ))
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+    raise SystemExit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+⏱️ Микробенчмарк нарезки текста: chunk_text против SentenceSegmenter
+Запуск: python bench_segmenter.py [--size 1000000] [--chunk-size 100]
+"""
+
+import argparse
+import logging
+import random
+import re
+import time
+
+from client import TTSStreamingClient
+from segmenter import SentenceSegmenter
+
+logger = logging.getLogger(__name__)
+
+WORDS = [
+    "привет", "мир", "синтез", "речи", "поток", "токен", "модель", "текст",
+    "hello", "world", "speech", "stream", "token", "model", "chunk", "audio",
+]
+PUNCTUATION = [". ", "! ", "? ", ", ", "; ", " ", " ", " ", " ", " ", " "]
+
+
+def make_text(size: int, seed: int = 1) -> str:
+    """Генерирует псевдотекст заданного размера с предложениями и клаузами"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        part = rng.choice(WORDS) + rng.choice(PUNCTUATION)
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)[:size]
+
+
+def make_tokens(text: str, seed: int = 2):
+    """Режет текст на куски по 1-8 символов, как токены LLM"""
+    rng = random.Random(seed)
+    tokens = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 8)
+        tokens.append(text[i:i + n])
+        i += n
+    return tokens
+
+
+def legacy_stream(client: TTSStreamingClient, tokens, max_chunk_size: int):
+    """Прежний цикл stream_tts_from_iterator: re.search и chunk_text по всему буферу"""
+    chunks = []
+    buffer = ""
+    for text_part in tokens:
+        buffer += text_part
+        if re.search(r'[.!?]+\s+', buffer) or len(buffer) > max_chunk_size:
+            parts = client.chunk_text(buffer, max_chunk_size)
+            chunks.extend(parts[:-1])
+            buffer = parts[-1] if parts else ""
+    chunks.extend(client.chunk_text(buffer, max_chunk_size))
+    return chunks
+
+
+def segmenter_stream(tokens, max_chunk_size: int):
+    segmenter = SentenceSegmenter(max_chunk_size)
+    chunks = []
+    for text_part in tokens:
+        chunks.extend(segmenter.feed(text_part))
+    chunks.extend(segmenter.flush())
+    return chunks
+
+
+def segmenter_whole(text: str, max_chunk_size: int):
+    segmenter = SentenceSegmenter(max_chunk_size)
+    return segmenter.feed(text) + segmenter.flush()
+
+
+def measure(name: str, func, chars: int):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"   {name:<32} {elapsed * 1000:9.1f} мс  "
+        f"{chars / elapsed / 1e6:7.2f} Мсимв/с  чанков: {len(result)}"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк нарезки текста")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Размер текста в символах")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Максимальный размер чанка")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    client = TTSStreamingClient()
+    text = make_text(args.size)
+    tokens = make_tokens(text)
+
+    logger.info(f"📝 Текст: {len(text)} символов, {len(tokens)} токенов, чанк {args.chunk_size}")
+    logger.info("📦 Весь текст сразу:")
+    measure("chunk_text", lambda: client.chunk_text(text, args.chunk_size), len(text))
+    measure("SentenceSegmenter.feed", lambda: segmenter_whole(text, args.chunk_size), len(text))
+
+    logger.info("🌊 Поток токенов:")
+    legacy = measure("chunk_text по буферу (прежний)", lambda: legacy_stream(client, tokens, args.chunk_size), len(text))
+    current = measure("SentenceSegmenter", lambda: segmenter_stream(tokens, args.chunk_size), len(text))
+    logger.info(f"🚀 Ускорение потоковой нарезки: x{legacy / current:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+⏱️ Бенчмарк холодного старта: время import client в новом процессе и
+накладные расходы коротких вызовов (TTSConfig, создание клиента, chunk_text)
+Запуск: python bench_startup.py [--runs 10] [--calls 2000] [--output startup.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Печатает время импорта и какие тяжелые модули реально загружены
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import client
+elapsed = time.perf_counter() - start
+loaded = [
+    name for name in ("aiohttp", "requests")
+    if name in sys.modules and type(sys.modules[name]).__name__ == "module"
+]
+print(elapsed, ",".join(loaded))
+"""
+
+TEXT = (
+    "Привет! Это короткий ответ для проверки накладных расходов. "
+    "Он режется на чанки, как в обычном CLI вызове; второе предложение длиннее первого."
+)
+
+
+def measure_import(runs: int) -> Dict[str, Any]:
+    """Время import client и запуска процесса целиком, медиана по runs процессам"""
+    imports = []
+    processes = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE], cwd=HERE, check=True,
+            capture_output=True, text=True,
+        ).stdout.split()
+        processes.append(time.perf_counter() - start)
+        imports.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else ""
+    return {
+        "import_ms": statistics.median(imports) * 1000,
+        "process_ms": statistics.median(processes) * 1000,
+        "heavy_modules_loaded": loaded.split(",") if loaded else [],
+    }
+
+
+def per_call(func: Callable[[], Any], calls: int) -> float:
+    """Среднее время вызова, микросекунды"""
+    func()
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def measure_calls(calls: int) -> Dict[str, float]:
+    sys.path.insert(0, HERE)
+    from client import SyncTTSClient, TTSConfig, TTSStreamingClient
+    from normalize import normalize_text
+
+    fd, config_file = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"cache_enabled": False}, f)
+    try:
+        sync_client = SyncTTSClient(config_file)
+        return {
+            "config_us": per_call(lambda: TTSConfig(config_file), calls),
+            "client_init_us": per_call(lambda: TTSStreamingClient(config_file), calls),
+            "sync_chunk_text_us": per_call(lambda: sync_client.chunk_text(TEXT, 60), calls),
+            "normalize_us": per_call(lambda: normalize_text(TEXT, "ru"), calls),
+        }
+    finally:
+        os.remove(config_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта клиента")
+    parser.add_argument("--runs", type=int, default=10, help="Процессов для замера импорта")
+    parser.add_argument("--calls", type=int, default=2000, help="Повторов для замера вызовов")
+    parser.add_argument("--output", default=None, help="Куда записать результаты JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    results: Dict[str, Any] = measure_import(args.runs)
+    logger.info(
+        f"📦 import client: {results['import_ms']:.1f} мс, процесс целиком: {results['process_ms']:.1f} мс, "
+        f"загружены при импорте: {', '.join(results['heavy_modules_loaded']) or 'ничего тяжелого'}"
+    )
+    if sys.dont_write_bytecode:
+        logger.info("⚠️ Запись .pyc отключена: устаревшие .pyc не обновляются, импорт может включать компиляцию")
+
+    results.update(measure_calls(args.calls))
+    for name in ("config_us", "client_init_us", "sync_chunk_text_us", "normalize_us"):
+        logger.info(f"   {name:<20} {results[name]:9.1f} мкс")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+⏱️ Бенчмарк клиента TTS на локальной имитации AllTalk
+Прогоняет входные точки TTSStreamingClient и пишет метрики в JSON:
+время до первого аудио, паузы между чанками, пропускную способность,
+перцентили p50/p95/p99 и пиковый RSS. Каждый сценарий идет в отдельном
+процессе клиента, а имитация сервера - в основном, поэтому пиковый RSS
+относится только к своему сценарию и сравним между прогонами.
+
+Запуск: python benchmark.py [--runs 3] [--output bench_results.json]
+Сравнение с прошлым прогоном: python benchmark.py --compare old.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from client import TTSStreamingClient
+from fake_server import FakeAllTalkServer
+from wav import WavAssembler, wav_duration
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ["chunk", "text", "text_incremental", "iterator", "file"]
+
+SENTENCES = [
+    "Привет, это тест потокового синтеза речи.",
+    "Каждое предложение отправляется на сервер отдельным запросом.",
+    "Короткая фраза.",
+    "Чем длиннее текст, тем дольше сервер его озвучивает, и тем важнее конвейер.",
+    "Hello, this is an English sentence in the middle of the text.",
+    "Проверяем паузы между чанками!",
+]
+
+
+def make_text(sentences: int) -> str:
+    return " ".join(SENTENCES[i % len(SENTENCES)] for i in range(sentences))
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 методом ближайшего ранга, плюс среднее и максимум"""
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+        return round(ordered[index], 6)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "mean": round(sum(ordered) / len(ordered), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS текущего процесса в МБ (None, если платформа не сообщает)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def write_config(server: FakeAllTalkServer, args) -> str:
+    """Временный конфиг клиента, направленный на имитацию; кэш выключен"""
+    config = {
+        "api_alltalk_protocol": "http://",
+        "api_alltalk_ip_port": server.address,
+        "api_connection_timeout": 60,
+        "cache_enabled": False,
+        "max_concurrent_chunks": args.concurrency,
+        "default_chunk_size": args.chunk_size,
+        "adaptive_chunking": args.adaptive,
+    }
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return path
+
+
+class Samples:
+    """Накопитель измерений одного сценария по всем прогонам"""
+
+    def __init__(self):
+        self.ttfa: List[float] = []
+        self.gaps: List[float] = []
+        self.latency: List[float] = []
+        self.wall = 0.0
+        self.audio = 0.0
+        self.chars = 0
+        self.chunks = 0
+
+    def add_stream(self, metrics: Dict[str, Any]) -> None:
+        if metrics.get("first_audio_delay") is not None:
+            self.ttfa.append(metrics["first_audio_delay"])
+        self.gaps.extend(metrics.get("chunk_gaps", []))
+
+    def report(self) -> Dict[str, Any]:
+        wall = self.wall or float("nan")
+        return {
+            "ttfa": percentiles(self.ttfa),
+            "chunk_gap": percentiles(self.gaps),
+            "latency": percentiles(self.latency),
+            "throughput": {
+                "audio_sec_per_sec": round(self.audio / wall, 3),
+                "chars_per_sec": round(self.chars / wall, 1),
+                "chunks_per_sec": round(self.chunks / wall, 3),
+            },
+            "audio_seconds": round(self.audio, 3),
+            "wall_seconds": round(self.wall, 3),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+async def run_chunk(client: TTSStreamingClient, text: str, samples: Samples) -> None:
+    """Последовательные одиночные запросы stream_tts_chunk_iter"""
+    for sentence in client.chunk_text(text):
+        started = time.perf_counter()
+        first = None
+        audio = bytearray()
+        async for frame in client.stream_tts_chunk_iter(sentence):
+            if first is None:
+                first = time.perf_counter() - started
+            audio += frame
+        samples.latency.append(time.perf_counter() - started)
+        samples.ttfa.append(first)
+        samples.audio += wav_duration(audio)
+        samples.chars += len(sentence)
+        samples.chunks += 1
+
+
+async def run_text(client: TTSStreamingClient, text: str, samples: Samples) -> None:
+    """generate_tts_from_text целыми чанками"""
+    async for audio in client.generate_tts_from_text(text):
+        samples.audio += wav_duration(audio)
+    samples.add_stream(client.last_stream_metrics)
+    samples.chars += len(text)
+    samples.chunks += client.last_stream_metrics["chunks"]
+
+
+async def run_text_incremental(client: TTSStreamingClient, text: str, samples: Samples) -> None:
+    """generate_tts_from_text сетевыми кадрами"""
+    with tempfile.TemporaryFile() as sink:
+        with WavAssembler(sink) as assembler:
+            async for frame in client.generate_tts_from_text(text, incremental=True):
+                assembler.feed(frame)
+    samples.add_stream(client.last_stream_metrics)
+    samples.audio += assembler.duration
+    samples.chars += len(text)
+    samples.chunks += assembler.chunks
+
+
+async def run_iterator(client: TTSStreamingClient, text: str, samples: Samples, token_rate: float) -> None:
+    """stream_tts_from_iterator с токенами, приходящими с частотой LLM"""
+    words = text.split(" ")
+
+    async def tokens():
+        for i, word in enumerate(words):
+            if token_rate > 0:
+                await asyncio.sleep(1.0 / token_rate)
+            yield word if i == 0 else " " + word
+
+    with tempfile.TemporaryFile() as sink:
+        with WavAssembler(sink) as assembler:
+            async for frame in client.stream_tts_from_iterator(tokens(), incremental=True):
+                assembler.feed(frame)
+    samples.add_stream(client.last_stream_metrics)
+    samples.audio += assembler.duration
+    samples.chars += len(text)
+    samples.chunks += assembler.chunks
+
+
+async def run_file(client: TTSStreamingClient, text: str, samples: Samples) -> None:
+    """generate_tts_to_file во временный файл"""
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        stats = await client.generate_tts_to_file(text, path)
+    finally:
+        os.remove(path)
+    samples.add_stream(client.last_stream_metrics)
+    samples.audio += stats["duration"]
+    samples.chars += len(text)
+    samples.chunks += stats["chunks"]
+
+
+async def run_scenario(name: str, config_file: str, text: str, args) -> Dict[str, Any]:
+    samples = Samples()
+    async with TTSStreamingClient(config_file) as client:
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            if name == "chunk":
+                await run_chunk(client, text, samples)
+            elif name == "text":
+                await run_text(client, text, samples)
+            elif name == "text_incremental":
+                await run_text_incremental(client, text, samples)
+            elif name == "iterator":
+                await run_iterator(client, text, samples, args.token_rate)
+            elif name == "file":
+                await run_file(client, text, samples)
+            samples.wall += time.perf_counter() - started
+    return samples.report()
+
+
+def worker_argv(name: str, config_file: str, args) -> List[str]:
+    """Командная строка процесса, прогоняющего один сценарий"""
+    return [
+        sys.executable, os.path.abspath(__file__),
+        "--worker", name, config_file,
+        "--runs", str(args.runs),
+        "--sentences", str(args.sentences),
+        "--token-rate", str(args.token_rate),
+    ]
+
+
+async def run_isolated(name: str, config_file: str, args) -> Dict[str, Any]:
+    """
+    Прогоняет сценарий в отдельном процессе клиента
+
+    ru_maxrss - пик за всю жизнь процесса, поэтому в общем процессе
+    каждый сценарий унаследовал бы пик предыдущих и самой имитации.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *worker_argv(name, config_file, args), stdout=asyncio.subprocess.PIPE
+    )
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"Сценарий {name} завершился с кодом {process.returncode}")
+    return json.loads(stdout)
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    server = await FakeAllTalkServer(
+        per_char_latency=args.per_char_latency,
+        base_latency=args.base_latency,
+        jitter=args.jitter,
+        frame_interval=args.frame_interval,
+        frame_bytes=args.frame_bytes,
+        gpu_slots=args.gpu_slots,
+        seed=args.seed,
+    ).start()
+    config_file = write_config(server, args)
+    text = make_text(args.sentences)
+    results: Dict[str, Any] = {}
+    try:
+        for name in args.scenarios:
+            logger.info(f"🏃 Сценарий {name}")
+            results[name] = await run_isolated(name, config_file, args)
+            ttfa = results[name]["ttfa"]["p50"]
+            logger.info(
+                f"📊 {name}: TTFA p50 {ttfa if ttfa is not None else float('nan'):.3f}с, "
+                f"{results[name]['throughput']['audio_sec_per_sec']:.1f} с аудио/с"
+            )
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": {
+            "per_char_latency": args.per_char_latency,
+            "base_latency": args.base_latency,
+            "jitter": args.jitter,
+            "frame_interval": args.frame_interval,
+            "frame_bytes": args.frame_bytes,
+            "gpu_slots": args.gpu_slots,
+        },
+        "client": {
+            "concurrency": args.concurrency,
+            "chunk_size": args.chunk_size,
+            "adaptive": args.adaptive,
+            "sentences": args.sentences,
+            "text_chars": len(text),
+            "runs": args.runs,
+            "token_rate": args.token_rate,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Печатает изменение ключевых метрик относительно прошлого прогона"""
+    rows = [
+        ("ttfa", "p50"), ("ttfa", "p95"), ("chunk_gap", "p95"), ("chunk_gap", "max"),
+        ("latency", "p50"), ("latency", "p99"), ("throughput", "audio_sec_per_sec"),
+    ]
+    for name, result in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        for group, key in rows:
+            new_value = result[group].get(key)
+            old_value = old.get(group, {}).get(key)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            logger.info(f"  {name:17} {group}.{key:18} {old_value:10.4f} → {new_value:10.4f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк клиента TTS на имитации AllTalk")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--sentences", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--adaptive", action="store_true", help="Адаптивный размер чанков")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Слов в секунду для сценария iterator")
+    parser.add_argument("--per-char-latency", type=float, default=0.002)
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--frame-interval", type=float, default=0.02)
+    parser.add_argument("--frame-bytes", type=int, default=4096)
+    parser.add_argument("--gpu-slots", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--worker", nargs=2, metavar=("SCENARIO", "CONFIG"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # Построчный лог клиента искажает замеры и засоряет вывод
+    logging.getLogger("client").setLevel(logging.WARNING)
+
+    if args.worker:
+        # Процесс одного сценария: отчет в stdout, настройки клиента - в конфиге
+        name, config_file = args.worker
+        report = asyncio.run(run_scenario(name, config_file, make_text(args.sentences), args))
+        json.dump(report, sys.stdout)
+        return
+
+    results = asyncio.run(run_benchmark(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    logger.info(f"💾 Результаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        logger.info(f"🔍 Сравнение с {args.compare}:")
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Кэш синтезированного аудио для повторяющихся фраз
+Два уровня: LRU в памяти и файлы на диске
+"""
+
+import collections
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AudioCache:
+    """Двухуровневый кэш аудио с TTL и вытеснением по размеру"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        memory_limit: int = 64 * 1024 * 1024,
+        disk_limit: int = 512 * 1024 * 1024,
+        ttl: float = 300
+    ):
+        """
+        Args:
+            cache_dir: Каталог дискового уровня (None - только память)
+            memory_limit: Максимальный объем аудио в памяти, байт
+            disk_limit: Максимальный объем аудио на диске, байт
+            ttl: Время жизни записи в секундах (0 - без ограничения)
+        """
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.ttl = ttl
+        # Память и диск под разными замками: поиск в памяти из цикла событий
+        # не ждет чтения или записи файла в другом потоке
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        # key -> (время создания, аудио); порядок - от давно использованных к свежим
+        self._memory: "collections.OrderedDict[str, Tuple[float, bytes]]" = collections.OrderedDict()
+        self._memory_size = 0
+        # key -> размер файла; индекс диска строится лениво при первом обращении
+        self._disk: Optional["collections.OrderedDict[str, int]"] = None
+        self._disk_size = 0
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(text: str, voice: str, language: str, model: str = "") -> str:
+        """Ключ записи: нормализованный текст, голос, язык и модель сервера"""
+        normalized = " ".join(text.split())
+        raw = "\x1f".join((normalized, voice or "", language or "", model or ""))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def get_memory(self, key: str) -> Optional[bytes]:
+        """
+        Возвращает аудио только из памяти или None
+
+        Не обращается к диску, поэтому вызывается прямо из цикла событий;
+        промах не учитывается - его посчитает get.
+        """
+        with self._lock:
+            return self._get_memory(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Возвращает аудио из кэша или None
+
+        С дисковым уровнем промах памяти читает диск (а первый вызов
+        сканирует каталог), поэтому из цикла событий вызывайте через
+        asyncio.to_thread.
+        """
+        with self._lock:
+            data = self._get_memory(key)
+            if data is not None:
+                return data
+
+        with self._disk_lock:
+            data, created = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._put_memory(key, data, created)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Сохраняет аудио в оба уровня кэша"""
+        if not data:
+            return
+        created = time.time()
+        with self._lock:
+            self._put_memory(key, data, created)
+        with self._disk_lock:
+            self._write_disk(key, data)
+
+    def clear(self) -> None:
+        """Очищает оба уровня кэша"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        with self._disk_lock:
+            if self.cache_dir:
+                for key in list(self._disk_index()):
+                    self._drop_disk(key)
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        created, data = entry
+        if self._expired(created):
+            self._drop_memory(key)
+            return None
+        self._memory.move_to_end(key)
+        self.stats["memory_hits"] += 1
+        return data
+
+    def _put_memory(self, key: str, data: bytes, created: float) -> None:
+        if len(data) > self.memory_limit:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (created, data)
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_limit:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+
+    def _drop_memory(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= len(entry[1])
+
+    def _disk_index(self) -> "collections.OrderedDict[str, int]":
+        if self._disk is None:
+            # Восстанавливаем индекс из каталога, старые файлы - первыми на вытеснение
+            found = []
+            if os.path.isdir(self.cache_dir):
+                for bucket in os.scandir(self.cache_dir):
+                    if not bucket.is_dir():
+                        continue
+                    for entry in os.scandir(bucket.path):
+                        if entry.name.endswith(".wav"):
+                            st = entry.stat()
+                            found.append((st.st_mtime, entry.name[:-4], st.st_size))
+            found.sort()
+            self._disk = collections.OrderedDict((key, size) for _, key, size in found)
+            self._disk_size = sum(size for _, _, size in found)
+        return self._disk
+
+    def _read_disk(self, key: str) -> Tuple[Optional[bytes], float]:
+        if not self.cache_dir or key not in self._disk_index():
+            return None, 0.0
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                created = os.fstat(f.fileno()).st_mtime
+                data = None if self._expired(created) else f.read()
+        except OSError:
+            data = None
+        if not data:
+            self._drop_disk(key)
+            return None, 0.0
+        self._disk.move_to_end(key)
+        return data, created
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if not self.cache_dir or len(data) > self.disk_limit:
+            return
+        index = self._disk_index()
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"❌ Ошибка записи в кэш: {e}")
+            return
+
+        self._disk_size -= index.pop(key, 0)
+        index[key] = len(data)
+        self._disk_size += len(data)
+        while self._disk_size > self.disk_limit:
+            self._drop_disk(next(iter(index)))
+
+    def _drop_disk(self, key: str) -> None:
+        self._disk_size -= self._disk_index().pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
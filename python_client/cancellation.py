@@ -0,0 +1,47 @@
+"""
+Отмена потока синтеза (barge-in)
+Ручка передается в генерацию; cancel() сразу снимает чанки из очереди,
+закрывает ответы в работе, а сервер получает /api/stop-generation
+"""
+
+from typing import Callable, List, Optional
+
+
+class CancelHandle:
+    """
+    Ручка отмены одного или нескольких потоков синтеза
+
+    cancel() нужно вызывать из цикла событий клиента (например, из
+    обработчика голоса пользователя). Поток, которому передана отмененная
+    ручка, просто заканчивается без исключения.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = []
+
+    def __repr__(self) -> str:
+        state = f"cancelled: {self.reason}" if self.cancelled else "active"
+        return f"CancelHandle({state})"
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Регистрирует действие при отмене; для уже отмененной ручки вызывает его сразу"""
+        if self.cancelled:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def cancel(self, reason: str = "barge-in") -> None:
+        """Отменяет все потоки, связанные с ручкой"""
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.reason = reason
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
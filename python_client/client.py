@@ -4,20 +4,51 @@
 """
 
 import asyncio
+import collections
+import io
+import itertools
+import random
 import re
+import sys
+import threading
 import time
 import json
 import os
 from typing import Iterator, Optional, AsyncIterator, List, Dict, Any
-import aiohttp
-import requests
 from urllib.parse import urlencode, quote
 import logging
 
+from lazy import lazy_import
+from adaptive import ChunkSizer
+from backends import BackendPool
+from cancellation import CancelHandle
+from cache import AudioCache
+from errors import TTSChunkError
+from wav import WavAssembler, parse_header, wav_duration
+from warmup import ServerInfo, fetch_server_info, wait_ready
+from scheduler import Scheduler, Ticket
+from segmenter import SentenceSegmenter
+from sessions import client_timeout, close_session, open_session, prewarm
+from singleflight import SingleFlight
+from tracing import ChunkSpan, NullSink, trace_config
+
+# Сетевой стек и правила нормализации загружаются при первом
+# использовании: импорт модуля и TTSConfig остаются дешевыми для
+# коротких CLI запусков
+aiohttp = lazy_import("aiohttp")
+normalize = lazy_import("normalize")
+
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Разобранные файлы конфигурации на процесс: абсолютный путь ->
+# ((mtime_ns, размер), содержимое файла)
+_config_cache: Dict[str, tuple] = {}
+_config_lock = threading.Lock()
+
+# Короткие фразы пробного синтеза при прогреве
+_WARMUP_TEXTS = {"ru": "Готово.", "en": "Ready."}
+
 
 class TTSConfig:
     """Простая конфигурация TTS клиента"""
@@ -27,30 +58,135 @@ class TTSConfig:
         self.default_config = {
             "api_alltalk_protocol": "http://",
             "api_alltalk_ip_port": "80.251.139.116:7851",
+            # Таймаут установки соединения, секунды
             "api_connection_timeout": 10,
+            # Максимальная пауза между байтами ответа (0 - без ограничения)
+            "api_read_timeout": 60,
+            # Общий лимит на запрос (0 - без ограничения, см. chunk_deadline)
+            "api_total_timeout": 0,
+            # Пул соединений: всего, на один сервер (0 - без ограничения)
+            "connection_limit": 100,
+            "connection_limit_per_host": 16,
+            # Сколько держать простаивающее соединение открытым (0 - не держать)
+            "keepalive_timeout": 30,
+            # Время жизни кэша DNS, секунды (0 - не кэшировать)
+            "dns_cache_ttl": 300,
+            # Одна сессия на все клиенты с одинаковыми настройками пула
+            "share_session": False,
+            # Сколько соединений с каждым сервером открыть при входе
+            "prewarm_connections": 0,
+            # Дополнительные серверы "ip:port" или полные URL; пустой список -
+            # работаем только с api_alltalk_ip_port
+            "api_alltalk_backends": [],
+            "health_check_interval": 5.0,
             "default_voice": "Arnold.wav",
             "default_language": "ru",
             "default_chunk_size": 100,
+            "max_concurrent_chunks": 3,
+            "stream_read_size": 16384,
+            "stream_buffer_frames": 8,
+            "cache_enabled": True,
+            "cache_ttl": 300,
+            # Каталог дискового уровня кэша (пусто - только память)
+            "cache_dir": "",
+            "cache_memory_bytes": 64 * 1024 * 1024,
+            "cache_disk_bytes": 512 * 1024 * 1024,
+            "cache_max_entry_bytes": 4 * 1024 * 1024,
+            "server_model": "",
+            "max_retries": 2,
+            "retry_delay": 0.5,
+            "retry_max_delay": 5.0,
+            # Крайний срок на чанк с учетом повторов, секунды (0 - без ограничения)
+            "chunk_deadline": 0,
+            "hedge_requests": False,
+            "hedge_quantile": 0.95,
+            "hedge_min_samples": 20,
+            "hedge_min_delay": 0.05,
+            "skip_failed_chunks": False,
+            # Одинаковые одновременные запросы (текст, голос, язык) идут на сервер один раз
+            "coalesce_requests": True,
+            # Нормализация текста чанка: разметка, пробелы, сокращения, числа словами
+            "normalize_text": True,
+            # Адаптивный размер чанков по измеренной скорости сервера: первый
+            # чанк короткий, следующие растут, пока синтез опережает воспроизведение
+            "adaptive_chunking": False,
+            "adaptive_first_chunk_size": 40,
+            "adaptive_min_chunk_size": 20,
+            "adaptive_max_chunk_size": 400,
+            # Доля длительности предыдущего чанка, за которую должен синтезироваться следующий
+            "adaptive_margin": 0.8,
+            # Планировщик: запросов на сервере одновременно (0 - без ограничения,
+            # ставьте по числу GPU слотов), предел очереди перед запросом того же
+            # или более высокого приоритета и слоты только для interactive
+            "max_inflight_requests": 0,
+            "max_queue_depth": 0,
+            "interactive_reserved_slots": 0,
+            # Брошенную генерацию останавливать через PUT /api/stop-generation
+            "stop_generation_on_cancel": True,
+            # Прогрев при входе в async with: ожидание /api/ready (до
+            # warmup_ready_timeout секунд), загрузка голосов и настроек и
+            # пробный синтез голосами warmup_voices (пусто - default_voice)
+            "warmup_on_enter": False,
+            "warmup_ready_timeout": 60,
+            "warmup_voices": [],
         }
+        self._signature: Optional[tuple] = None
         self.config = self.load_config()
     
-    def load_config(self) -> Dict[str, Any]:
-        """Загружает конфигурацию из файла или создает с настройками по умолчанию"""
+    def _stat(self) -> Optional[tuple]:
         try:
-            if os.path.exists(self.config_file):
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load_config(self) -> Dict[str, Any]:
+        """
+        Загружает конфигурацию из файла или берет настройки по умолчанию
+        
+        Разобранный файл кэшируется на весь процесс и читается заново, только
+        если изменились его mtime или размер. Отсутствующий файл не создается -
+        записать настройки можно через save_config.
+        """
+        signature = self._stat()
+        self._signature = signature
+        if signature is None:
+            logger.debug(f"Файл конфигурации {self.config_file} не найден, используются настройки по умолчанию")
+            return self.default_config.copy()
+        
+        path = os.path.abspath(self.config_file)
+        with _config_lock:
+            entry = _config_cache.get(path)
+        if entry is not None and entry[0] == signature:
+            parsed = entry[1]
+        else:
+            try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                # Дополняем недостающие ключи значениями по умолчанию
-                for key, value in self.default_config.items():
-                    config.setdefault(key, value)
-                return config
-            else:
-                logger.info(f"Создается новый файл конфигурации {self.config_file}")
-                self.save_config(self.default_config)
+                    parsed = json.load(f)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки конфигурации: {e}")
                 return self.default_config.copy()
-        except Exception as e:
-            logger.error(f"Ошибка загрузки конфигурации: {e}")
-            return self.default_config.copy()
+            with _config_lock:
+                _config_cache[path] = (signature, parsed)
+        
+        # Копия: изменения config одного клиента не видны другим
+        config = dict(parsed)
+        # Дополняем недостающие ключи значениями по умолчанию
+        for key, value in self.default_config.items():
+            config.setdefault(key, value)
+        return config
+    
+    def reload(self) -> bool:
+        """
+        Перечитывает конфигурацию, если файл изменился с момента загрузки
+        
+        Returns:
+            True, если конфигурация обновилась
+        """
+        if self._stat() == self._signature:
+            return False
+        self.config = self.load_config()
+        return True
     
     def save_config(self, config: Dict[str, Any] = None) -> None:
         """Сохраняет конфигурацию в файл"""
@@ -60,30 +196,221 @@ class TTSConfig:
                 json.dump(config_to_save, f, indent=4, ensure_ascii=False)
         except Exception as e:
             logger.error(f"Ошибка сохранения конфигурации: {e}")
+            return
+        if config is None or config is self.config:
+            self._signature = self._stat()
     
     @property
     def base_url(self) -> str:
         """Возвращает базовый URL для API"""
         return f"{self.config['api_alltalk_protocol']}{self.config['api_alltalk_ip_port']}"
+    
+    @property
+    def backend_urls(self) -> List[str]:
+        """Возвращает базовые URL всех серверов AllTalk"""
+        backends = self.config.get('api_alltalk_backends') or []
+        if isinstance(backends, str):
+            backends = [backends]
+        urls = [
+            backend if "://" in backend else f"{self.config['api_alltalk_protocol']}{backend}"
+            for backend in backends
+        ]
+        return urls or [self.base_url]
+
+
+class ChunkResult:
+    """Результат синтеза одного чанка: аудио или описание ошибки"""
+    
+    def __init__(
+        self,
+        text: str,
+        audio: bytes = b"",
+        status: Optional[int] = None,
+        error: Optional[str] = None,
+        retryable: bool = False,
+        attempts: int = 0,
+        elapsed: float = 0.0,
+        backend: Optional[str] = None,
+        cached: bool = False
+    ):
+        self.text = text
+        self.audio = audio
+        self.status = status
+        self.error = error
+        self.retryable = retryable
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.backend = backend
+        self.cached = cached
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+    
+    def __repr__(self) -> str:
+        state = f"{len(self.audio)} байт" if self.ok else f"ошибка: {self.error}"
+        return f"ChunkResult('{self.text[:30]}', {state}, попыток: {self.attempts})"
 
 
 class TTSStreamingClient:
     """Упрощенный клиент для потокового TTS API AllTalk"""
     
-    def __init__(self, config_file: str = "tts_config.json"):
+    def __init__(self, config_file: str = "tts_config.json", trace_sink=None):
+        """
+        Args:
+            config_file: Путь к файлу конфигурации
+            trace_sink: Приемник замеров чанков (PrometheusSink, CallbackSink);
+                None - трассировка выключена
+        """
         self.config = TTSConfig(config_file)
+        self.tracer = trace_sink or NullSink()
         self.session: Optional[aiohttp.ClientSession] = None
+        self._chunk_counter = itertools.count(1)
+        # Метрики последнего потока: задержка первого аудио и паузы между чанками
+        self.last_stream_metrics: Dict[str, Any] = {}
+        # Модель сервера входит в ключ кэша: смена модели меняет звучание
+        self.server_model: str = self.config.config['server_model']
+        self.pool = BackendPool(
+            self.config.backend_urls,
+            health_check_interval=self.config.config['health_check_interval'],
+            stop_on_abandon=self.config.config['stop_generation_on_cancel'],
+        )
+        # Задержки успешных запросов - по ним считается порог хеджирования
+        self._latencies: "collections.deque[float]" = collections.deque(maxlen=200)
+        # Окно потока общего запроса - как буфер кадров чанка, который еще не играет
+        self.flights = SingleFlight(stream_window=self.config.config['stream_buffer_frames'])
+        # Голоса и настройки сервера после прогрева - по ним запросы проверяются локально
+        self.server_info: Optional[ServerInfo] = None
+        self.normalizer = normalize.TextNormalizer(self.config.config['normalize_text'])
+        self.scheduler = Scheduler(
+            max_concurrency=self.config.config['max_inflight_requests'],
+            max_queue_depth=self.config.config['max_queue_depth'],
+            interactive_reserve=self.config.config['interactive_reserved_slots'],
+        )
+        # Скорость синтеза по голосам и языкам - по ней выбирается размер чанков
+        self.sizer = ChunkSizer(
+            first_chunk_size=self.config.config['adaptive_first_chunk_size'],
+            min_chunk_size=self.config.config['adaptive_min_chunk_size'],
+            max_chunk_size=self.config.config['adaptive_max_chunk_size'],
+            margin=self.config.config['adaptive_margin'],
+        )
+        self.cache: Optional[AudioCache] = None
+        if self.config.config['cache_enabled']:
+            self.cache = AudioCache(
+                cache_dir=self.config.config['cache_dir'] or None,
+                memory_limit=self.config.config['cache_memory_bytes'],
+                disk_limit=self.config.config['cache_disk_bytes'],
+                ttl=self.config.config['cache_ttl'],
+            )
         
     async def __aenter__(self):
         """Асинхронный контекстный менеджер - вход"""
-        timeout = aiohttp.ClientTimeout(total=self.config.config['api_connection_timeout'])
-        self.session = aiohttp.ClientSession(timeout=timeout)
+        trace_configs = [trace_config()] if self.tracer.enabled else None
+        self.session = open_session(self.config.config, trace_configs)
+        try:
+            self.pool.start(self.session)
+            await prewarm(self.session, self.config.backend_urls, self.config.config['prewarm_connections'])
+            if self.config.config['warmup_on_enter']:
+                await self.warm_up()
+        except BaseException:
+            # При ошибке или отмене прогрева __aexit__ не вызовется - закрываем
+            # сессию и проверку здоровья сами
+            await self.__aexit__(*sys.exc_info())
+            raise
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Асинхронный контекстный менеджер - выход"""
+        await self.pool.stop()
         if self.session:
-            await self.session.close()
+            await close_session(self.session)
+            self.session = None
+    
+    async def warm_up(self, voices: List[str] = None, language: str = None) -> Dict[str, Any]:
+        """
+        Готовит серверы к первому запросу
+        
+        Ждет /api/ready каждого сервера с экспоненциальной задержкой, загружает
+        голоса и настройки в server_info (дальше голос и язык проверяются без
+        обращения к серверу) и синтезирует короткую фразу каждым голосом на
+        каждом готовом сервере, чтобы модель и голоса были загружены.
+        
+        Args:
+            voices: Голоса для пробного синтеза (по умолчанию warmup_voices или default_voice)
+            language: Язык пробного синтеза
+            
+        Returns:
+            Словарь: готовые серверы, модель, число голосов, пробных синтезов и время
+        """
+        if not self.session:
+            raise RuntimeError("Клиент не инициализирован. Используйте async with.")
+        started = time.perf_counter()
+        language = language or self.config.config['default_language']
+        voices = list(voices or self.config.config['warmup_voices'] or [self.config.config['default_voice']])
+        timeout = self.config.config['warmup_ready_timeout']
+        
+        ready = await asyncio.gather(*(
+            wait_ready(self.session, backend.url, timeout) for backend in self.pool.backends
+        ))
+        ready_backends = []
+        for backend, is_ready in zip(self.pool.backends, ready):
+            backend.healthy = is_ready
+            if is_ready:
+                ready_backends.append(backend)
+            else:
+                logger.warning(f"⚠️ Сервер {backend.url} не готов за {timeout}с")
+        summary: Dict[str, Any] = {"ready": [backend.url for backend in ready_backends], "primed": 0}
+        if not ready_backends:
+            summary["elapsed"] = time.perf_counter() - started
+            return summary
+        
+        try:
+            self.server_info = await fetch_server_info(self.session, ready_backends[0].url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"⚠️ Не удалось загрузить голоса и настройки: {e}")
+        if self.server_info is not None:
+            # Явно заданная модель в конфигурации важнее ответа сервера
+            if self.server_info.model and not self.config.config['server_model']:
+                self.server_model = self.server_info.model
+            summary["model"] = self.server_info.model
+            summary["voices"] = len(self.server_info.voices)
+            for voice in list(voices):
+                error = self.server_info.validate(voice, language)
+                if error:
+                    logger.warning(f"⚠️ Прогрев пропускает голос: {error}")
+                    voices.remove(voice)
+        
+        text = _WARMUP_TEXTS.get(language, "Ok.")
+        primed = await asyncio.gather(*(
+            self._prime(backend.url, text, voice, language)
+            for backend in ready_backends for voice in voices
+        ))
+        summary["primed"] = sum(primed)
+        summary["elapsed"] = time.perf_counter() - started
+        logger.info(
+            f"🔥 Прогрев: серверов {len(ready_backends)}/{len(self.pool.backends)}, "
+            f"пробных синтезов {summary['primed']}/{len(primed)} за {summary['elapsed']:.2f}с"
+        )
+        return summary
+    
+    async def _prime(self, url: str, text: str, voice: str, language: str) -> bool:
+        """Пробный синтез мимо кэша и планировщика; аудио отбрасывается"""
+        try:
+            async with self.session.get(
+                url + self._streaming_path(text, voice, language),
+                timeout=self._request_timeout(None)
+            ) as response:
+                await response.read()
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"⚠️ Пробный синтез на {url} голосом {voice}: {e}")
+            return False
+    
+    def _validate(self, voice: str, language: str) -> Optional[str]:
+        """Ошибка голоса или языка по данным прогрева (None - проверка пройдена или данных нет)"""
+        if self.server_info is None:
+            return None
+        return self.server_info.validate(voice, language)
     
     def chunk_text(self, text: str, max_chunk_size: int = None) -> List[str]:
         """
@@ -153,28 +480,14 @@ class TTSStreamingClient:
             
         return chunks
     
-    async def stream_tts_chunk(
-        self, 
-        text: str, 
-        voice: str = None, 
+    def _streaming_path(
+        self,
+        text: str,
+        voice: str = None,
         language: str = None,
         output_file: str = None
-    ) -> bytes:
-        """
-        Генерирует TTS для одного чанка текста через GET запрос как в документации
-        
-        Args:
-            text: Текст для преобразования
-            voice: Голос для использования
-            language: Язык
-            output_file: Имя выходного файла
-            
-        Returns:
-            Аудиоданные в байтах
-        """
-        if not text.strip():
-            return b""
-        
+    ) -> str:
+        """Собирает путь GET запроса к потоковому эндпоинту (без адреса сервера)"""
         if not self.session:
             raise RuntimeError("Клиент не инициализирован. Используйте async with.")
         
@@ -185,7 +498,8 @@ class TTSStreamingClient:
         # Генерируем уникальное имя файла если не указано
         if not output_file:
             timestamp = int(time.time() * 1000)
-            output_file = f"tts_chunk_{timestamp}.wav"
+            # Счетчик нужен, чтобы параллельные запросы не делили один файл
+            output_file = f"tts_chunk_{timestamp}_{next(self._chunk_counter)}.wav"
         
         # Создаем URL с параметрами как в документации
         params = {
@@ -197,52 +511,861 @@ class TTSStreamingClient:
         
         # Кодируем параметры для URL
         encoded_params = urlencode(params, quote_via=quote)
-        streaming_url = f"{self.config.base_url}/api/tts-generate-streaming?{encoded_params}"
+        return f"/api/tts-generate-streaming?{encoded_params}"
+    
+    def _cache_key(self, text: str, voice: str = None, language: str = None) -> Optional[str]:
+        """Ключ кэша для чанка или None, если кэш выключен"""
+        if self.cache is None:
+            return None
+        return AudioCache.make_key(
+            text,
+            voice or self.config.config['default_voice'],
+            language or self.config.config['default_language'],
+            self.server_model,
+        )
+    
+    async def _cache_lookup(self, key: Optional[str]) -> Optional[bytes]:
+        """Ищет аудио в кэше; промах памяти читает диск в отдельном потоке"""
+        if key is None:
+            return None
+        cached = self.cache.get_memory(key)
+        if cached is not None:
+            return cached
+        if not self.cache.cache_dir:
+            # Только память - get не блокирует, а промах попадет в статистику
+            return self.cache.get(key)
+        return await asyncio.to_thread(self.cache.get, key)
+    
+    async def _cache_store(self, key: Optional[str], audio_data: bytes) -> None:
+        """Сохраняет аудио в кэш, запись на диск идет в отдельном потоке"""
+        if key is None or not audio_data:
+            return
+        if len(audio_data) > self.config.config['cache_max_entry_bytes']:
+            return
+        await asyncio.to_thread(self.cache.put, key, audio_data)
+    
+    def _retry_delay(self, attempt: int) -> float:
+        """Экспоненциальная задержка перед повтором с полным джиттером"""
+        base = self.config.config['retry_delay'] * (2 ** attempt)
+        return random.uniform(0, min(base, self.config.config['retry_max_delay']))
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """Через сколько отправлять дублирующий запрос (None - не хеджируем)"""
+        # На единственном сервере дубликат встанет в ту же очередь GPU
+        # за основным запросом и только удвоит нагрузку
+        if not self.config.config['hedge_requests'] or len(self.pool) == 1:
+            return None
+        if len(self._latencies) < self.config.config['hedge_min_samples']:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.config.config['hedge_quantile']))
+        return max(ordered[index], self.config.config['hedge_min_delay'])
+    
+    def _request_timeout(self, deadline: Optional[float]):
+        """Таймаут запроса, укладывающийся в крайний срок чанка"""
+        # timeout=None в aiohttp отключает все таймауты сессии, поэтому без
+        # крайнего срока передаем таймауты из конфигурации
+        if deadline is None:
+            return client_timeout(self.config.config)
+        return client_timeout(self.config.config, total=max(0.0, deadline - time.monotonic()))
+    
+    def _start_span(
+        self,
+        text: str,
+        voice: str,
+        language: str,
+        priority: str,
+        tenant: Optional[str],
+        streaming: bool
+    ) -> Optional[ChunkSpan]:
+        """Спан запроса к серверу или None, если трассировка выключена"""
+        if not self.tracer.enabled:
+            return None
+        return ChunkSpan(len(text), voice, language, priority, tenant, streaming)
+    
+    async def _fetch_once(
+        self,
+        text: str,
+        voice: str,
+        language: str,
+        output_file: Optional[str],
+        deadline: Optional[float],
+        ticket: Ticket
+    ) -> ChunkResult:
+        """Одна попытка синтеза на одном сервере пула"""
+        streaming_path = self._streaming_path(text, voice, language, output_file)
+        span = self._start_span(text, voice, language, ticket.priority, ticket.tenant, streaming=False)
+        await self.scheduler.acquire(ticket=ticket)
+        # Ожидание в очереди планировщика не входит в задержку сервера
+        started = time.perf_counter()
+        if span is not None:
+            # Пока запрос ждал, к нему мог присоединиться более срочный
+            span.priority, span.tenant = ticket.priority, ticket.tenant
+            span.admitted()
+        result = None
+        try:
+            result = await self._fetch_attempt(text, streaming_path, deadline, started, span)
+            return result
+        finally:
+            self.scheduler.release()
+            if span is not None:
+                if result is None:
+                    span.finish(error="отменен")
+                else:
+                    span.finish(len(result.audio), result.error)
+                self.tracer.record(span)
+    
+    async def _fetch_attempt(
+        self,
+        text: str,
+        streaming_path: str,
+        deadline: Optional[float],
+        started: float,
+        span: Optional[ChunkSpan]
+    ) -> ChunkResult:
+        backend_url = None
+        try:
+            # Используем GET запрос как в JavaScript примере
+            async with self.pool.lease() as backend:
+                backend_url = backend.url
+                async with self.session.get(
+                    backend.url + streaming_path,
+                    timeout=self._request_timeout(deadline),
+                    trace_request_ctx=span
+                ) as response:
+                    if span is not None:
+                        span.headers(backend_url, response.status)
+                    if response.status == 200:
+                        audio_data = await response.read()
+                        elapsed = time.perf_counter() - started
+                        if not audio_data:
+                            return ChunkResult(
+                                text, status=200, error="пустой ответ сервера",
+                                retryable=True, elapsed=elapsed, backend=backend_url
+                            )
+                        self._latencies.append(elapsed)
+                        return ChunkResult(
+                            text, audio_data, status=200, elapsed=elapsed, backend=backend_url
+                        )
+                    
+                    if response.status >= 500:
+                        self.pool.report_failure(backend)
+                    error_text = await response.text()
+                    return ChunkResult(
+                        text,
+                        status=response.status,
+                        error=f"HTTP {response.status}: {error_text[:200]}",
+                        # 4xx кроме 429 повторять бессмысленно
+                        retryable=response.status >= 500 or response.status == 429,
+                        elapsed=time.perf_counter() - started,
+                        backend=backend_url,
+                    )
+        except asyncio.TimeoutError:
+            return ChunkResult(
+                text, error="таймаут запроса", retryable=True,
+                elapsed=time.perf_counter() - started, backend=backend_url
+            )
+        except aiohttp.ClientError as e:
+            return ChunkResult(
+                text, error=f"{type(e).__name__}: {e}", retryable=True,
+                elapsed=time.perf_counter() - started, backend=backend_url
+            )
+    
+    async def _fetch_hedged(
+        self,
+        text: str,
+        voice: str,
+        language: str,
+        output_file: Optional[str],
+        deadline: Optional[float],
+        ticket: Ticket
+    ) -> ChunkResult:
+        """
+        Попытка с хеджированием: если ответа нет дольше p95 задержки,
+        отправляем дубликат (пул выберет другой сервер) и берем первый успех;
+        с одним сервером в пуле хеджирование не используется
+        """
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._fetch_once(text, voice, language, output_file, deadline, ticket)
+        
+        primary = asyncio.ensure_future(self._fetch_once(text, voice, language, output_file, deadline, ticket))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+        
+        logger.info(f"🔀 Хеджирующий запрос для '{text[:30]}...' после {hedge_delay:.2f}с")
+        hedge = asyncio.ensure_future(self._fetch_once(text, voice, language, output_file, deadline, ticket))
+        pending = {primary, hedge}
+        result = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.ok:
+                        return result
+            return result
+        except BaseException:
+            # Отменили сам чанк (например, перебивание) - генерацию останавливаем как обычно
+            for task in pending:
+                task.cancel()
+            pending = set()
+            raise
+        finally:
+            # Проигравший дубликат: ответ уже есть, а остановка на сервере
+            # прервала бы и чужую генерацию
+            for task in pending:
+                self.pool.cancel_quietly(task)
+    
+    async def synthesize_chunk(
+        self,
+        text: str,
+        voice: str = None,
+        language: str = None,
+        output_file: str = None,
+        priority: str = "normal",
+        tenant: str = None
+    ) -> ChunkResult:
+        """
+        Генерирует TTS для одного чанка с повторами, крайним сроком и хеджированием
+        
+        Повторяются сетевые ошибки, таймауты, 5xx и 429 - не больше
+        max_retries раз с экспоненциальной задержкой и джиттером. Все попытки
+        укладываются в chunk_deadline. Перед запросом текст проходит
+        нормализацию (normalize_text), поэтому одинаковые по смыслу фразы
+        делят ключ кэша.
+        
+        Args:
+            text: Текст для преобразования
+            voice: Голос для использования
+            language: Язык
+            output_file: Имя выходного файла
+            priority: Класс приоритета планировщика: interactive, normal, batch
+            tenant: Арендатор для честной очереди внутри класса
+            
+        Returns:
+            ChunkResult с аудио или описанием ошибки
+            
+        Raises:
+            TTSOverloadError: если очередь планировщика переполнена
+        """
+        if not text.strip():
+            return ChunkResult(text)
+        
+        voice = voice or self.config.config['default_voice']
+        language = language or self.config.config['default_language']
+        text = self.normalizer(text, language)
+        if not text:
+            return ChunkResult(text)
+        error = self._validate(voice, language)
+        if error:
+            return ChunkResult(text, error=error)
+        
+        # Повторяющиеся фразы отдаем из кэша без обращения к серверу
+        cache_key = self._cache_key(text, voice, language)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            if self.tracer.enabled:
+                self.tracer.record(ChunkSpan.from_cache(len(text), voice, language, priority, tenant, len(cached)))
+            return ChunkResult(text, cached, cached=True)
+        
+        if not self.session:
+            raise RuntimeError("Клиент не инициализирован. Используйте async with.")
+        
+        # Одинаковые запросы в работе объединяем: все ожидающие получат
+        # один и тот же ChunkResult, а запрос идет с наивысшим их приоритетом
+        ticket = Ticket(priority, tenant)
+        flight_key = self._flight_key(text, voice, language, output_file)
+        if flight_key is not None:
+            return await self.flights.run(
+                flight_key,
+                lambda: self._synthesize_remote(text, voice, language, output_file, cache_key, ticket),
+                ticket
+            )
+        return await self._synthesize_remote(text, voice, language, output_file, cache_key, ticket)
+    
+    def _flight_key(self, text: str, voice: str, language: str, output_file: Optional[str]) -> Optional[str]:
+        """Ключ объединения запросов или None, если объединять нельзя"""
+        # Явное имя файла на сервере - отдельный запрос по желанию вызывающего
+        if output_file is not None or not self.config.config['coalesce_requests']:
+            return None
+        return AudioCache.make_key(text, voice, language, self.server_model)
+    
+    async def _synthesize_remote(
+        self,
+        text: str,
+        voice: str,
+        language: str,
+        output_file: Optional[str],
+        cache_key: Optional[str],
+        ticket: Ticket
+    ) -> ChunkResult:
+        """Синтез чанка на сервере с повторами; успешный результат попадает в кэш"""
+        chunk_deadline = self.config.config['chunk_deadline']
+        deadline = time.monotonic() + chunk_deadline if chunk_deadline else None
+        max_attempts = self.config.config['max_retries'] + 1
+        started = time.perf_counter()
         
         logger.info(f"🌊 Запрос TTS: '{text[:50]}...' через GET")
         
+        for attempt in range(max_attempts):
+            result = await self._fetch_hedged(text, voice, language, output_file, deadline, ticket)
+            result.attempts = attempt + 1
+            if result.ok or not result.retryable or attempt + 1 == max_attempts:
+                break
+            delay = self._retry_delay(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                result.error = f"крайний срок {chunk_deadline}с истек: {result.error}"
+                break
+            logger.warning(
+                f"🔄 Повтор {attempt + 1}/{max_attempts - 1} через {delay:.2f}с: {result.error}"
+            )
+            await asyncio.sleep(delay)
+        
+        if result.ok:
+            # Время успешной попытки без повторов - это скорость самого сервера
+            self.sizer.record(voice, language, len(text), result.elapsed, wav_duration(result.audio))
+        result.elapsed = time.perf_counter() - started
+        if result.ok:
+            logger.info(f"✅ Получено {len(result.audio)} байт аудио")
+            await self._cache_store(cache_key, result.audio)
+        else:
+            logger.error(f"❌ Ошибка TTS после {result.attempts} попыток: {result.error}")
+        return result
+    
+    async def stream_tts_chunk(
+        self, 
+        text: str, 
+        voice: str = None, 
+        language: str = None,
+        output_file: str = None,
+        priority: str = "normal",
+        tenant: str = None
+    ) -> bytes:
+        """
+        Генерирует TTS для одного чанка текста через GET запрос как в документации
+        
+        Args:
+            text: Текст для преобразования
+            voice: Голос для использования
+            language: Язык
+            output_file: Имя выходного файла
+            priority: Класс приоритета планировщика: interactive, normal, batch
+            tenant: Арендатор для честной очереди внутри класса
+            
+        Returns:
+            Аудиоданные в байтах (пустые при ошибке - причину вернет synthesize_chunk)
+            
+        Raises:
+            TTSOverloadError: если очередь планировщика переполнена
+        """
+        result = await self.synthesize_chunk(text, voice, language, output_file, priority, tenant)
+        return result.audio
+    
+    async def stream_tts_chunk_iter(
+        self,
+        text: str,
+        voice: str = None,
+        language: str = None,
+        output_file: str = None,
+        read_size: int = None,
+        priority: str = "normal",
+        tenant: str = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Генерирует TTS для одного чанка и отдает аудио по мере прихода из сети
+        
+        В отличие от stream_tts_chunk не ждет конца ответа: первый кадр
+        доступен сразу после первого сетевого пакета, а в памяти держится
+        не больше одного кадра размером read_size. Повторы возможны только
+        до первого кадра; крайний срок chunk_deadline действует на весь ответ.
+        
+        Args:
+            text: Текст для преобразования
+            voice: Голос для использования
+            language: Язык
+            output_file: Имя выходного файла
+            read_size: Максимальный размер кадра в байтах
+            priority: Класс приоритета планировщика
+            tenant: Арендатор для честной очереди
+            
+        Yields:
+            Кадры аудиопотока (первый содержит WAV заголовок)
+            
+        Raises:
+            TTSChunkError: если чанк не удалось получить
+            TTSOverloadError: если очередь планировщика переполнена
+        """
+        if not text.strip():
+            return
+        
+        voice = voice or self.config.config['default_voice']
+        language = language or self.config.config['default_language']
+        read_size = read_size or self.config.config['stream_read_size']
+        text = self.normalizer(text, language)
+        if not text:
+            return
+        error = self._validate(voice, language)
+        if error:
+            raise TTSChunkError(ChunkResult(text, error=error))
+        cache_key = self._cache_key(text, voice, language)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            if self.tracer.enabled:
+                self.tracer.record(ChunkSpan.from_cache(len(text), voice, language, priority, tenant, len(cached)))
+            for offset in range(0, len(cached), read_size):
+                yield cached[offset:offset + read_size]
+            return
+        
+        # Поздние слушатели того же запроса сначала получают уже пришедшие
+        # кадры, затем следуют за живым потоком
+        ticket = Ticket(priority, tenant)
+        flight_key = self._flight_key(text, voice, language, output_file)
+        if flight_key is not None:
+            source = self.flights.stream(
+                flight_key,
+                lambda: self._stream_remote(text, voice, language, output_file, read_size, cache_key, ticket),
+                ticket
+            )
+        else:
+            source = self._stream_remote(text, voice, language, output_file, read_size, cache_key, ticket)
         try:
-            # Используем GET запрос как в JavaScript примере
-            async with self.session.get(streaming_url) as response:
-                if response.status == 200:
-                    audio_data = await response.read()
-                    logger.info(f"✅ Получено {len(audio_data)} байт аудио")
-                    return audio_data
+            async for frame in source:
+                yield frame
+        finally:
+            await source.aclose()
+    
+    async def _stream_remote(
+        self,
+        text: str,
+        voice: str,
+        language: str,
+        output_file: Optional[str],
+        read_size: int,
+        cache_key: Optional[str],
+        ticket: Ticket
+    ) -> AsyncIterator[bytes]:
+        """Потоковый запрос чанка к серверу с повторами до первого кадра"""
+        chunk_deadline = self.config.config['chunk_deadline']
+        deadline = time.monotonic() + chunk_deadline if chunk_deadline else None
+        max_attempts = self.config.config['max_retries'] + 1
+        started = time.perf_counter()
+        
+        logger.info(f"🌊 Потоковый запрос TTS: '{text[:50]}...' через GET")
+        
+        for attempt in range(max_attempts):
+            result = ChunkResult(text, attempts=attempt + 1)
+            total = 0
+            first_frame = None
+            span = self._start_span(text, voice, language, ticket.priority, ticket.tenant, streaming=True)
+            try:
+                streaming_path = self._streaming_path(text, voice, language, output_file)
+                async with self.scheduler.slot(ticket=ticket):
+                    # Ожидание в очереди планировщика не входит в скорость сервера
+                    attempt_started = time.perf_counter()
+                    if span is not None:
+                        span.priority, span.tenant = ticket.priority, ticket.tenant
+                        span.admitted()
+                    async with self.pool.lease() as backend:
+                        result.backend = backend.url
+                        async with self.session.get(
+                            backend.url + streaming_path,
+                            timeout=self._request_timeout(deadline),
+                            trace_request_ctx=span
+                        ) as response:
+                            result.status = response.status
+                            if span is not None:
+                                span.headers(backend.url, response.status)
+                            if response.status != 200:
+                                if response.status >= 500:
+                                    self.pool.report_failure(backend)
+                                error_text = await response.text()
+                                result.error = f"HTTP {response.status}: {error_text[:200]}"
+                                result.retryable = response.status >= 500 or response.status == 429
+                            else:
+                                # Копию для кэша держим, только пока она не больше лимита записи
+                                max_entry = self.config.config['cache_max_entry_bytes']
+                                cached_frames: Optional[List[bytes]] = [] if cache_key is not None else None
+                                async for frame in response.content.iter_chunked(read_size):
+                                    if first_frame is None:
+                                        first_frame = frame
+                                    total += len(frame)
+                                    if cached_frames is not None:
+                                        cached_frames.append(frame)
+                                        if total > max_entry:
+                                            cached_frames = None
+                                    yield frame
+                                if not total:
+                                    result.error = "пустой ответ сервера"
+                                    result.retryable = True
+            except asyncio.TimeoutError:
+                result.error = "таймаут запроса"
+                result.retryable = True
+            except aiohttp.ClientError as e:
+                result.error = f"{type(e).__name__}: {e}"
+                result.retryable = True
+            except (asyncio.CancelledError, GeneratorExit):
+                if span is not None:
+                    span.finish(total, "отменен")
+                    self.tracer.record(span)
+                raise
+            if span is not None:
+                span.finish(total, result.error)
+                self.tracer.record(span)
+            
+            if result.ok:
+                self._record_stream_speed(
+                    voice, language, text, time.perf_counter() - attempt_started, first_frame, total
+                )
+                logger.info(f"✅ Получено {total} байт аудио потоком")
+                if cached_frames:
+                    await self._cache_store(cache_key, b"".join(cached_frames))
+                return
+            
+            # После первого отданного кадра повтор склеил бы два ответа
+            if total or not result.retryable or attempt + 1 == max_attempts:
+                break
+            delay = self._retry_delay(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                result.error = f"крайний срок {chunk_deadline}с истек: {result.error}"
+                break
+            logger.warning(
+                f"🔄 Повтор {attempt + 1}/{max_attempts - 1} через {delay:.2f}с: {result.error}"
+            )
+            await asyncio.sleep(delay)
+        
+        result.elapsed = time.perf_counter() - started
+        logger.error(f"❌ Ошибка потокового TTS после {result.attempts} попыток: {result.error}")
+        raise TTSChunkError(result)
+    
+    def _record_stream_speed(
+        self,
+        voice: str,
+        language: str,
+        text: str,
+        elapsed: float,
+        first_frame: bytes,
+        total: int
+    ) -> None:
+        """Учитывает скорость потокового ответа по заголовку первого кадра и объему данных"""
+        try:
+            header = parse_header(first_frame)
+        except ValueError:
+            return
+        if header is None or not header[0].byte_rate:
+            return
+        fmt, offset, _ = header
+        self.sizer.record(voice, language, len(text), elapsed, (total - offset) / fmt.byte_rate)
+    
+    async def _adaptive_chunks(self, text: str, voice: str, language: str) -> AsyncIterator[str]:
+        """
+        Нарезает текст чанками растущего размера
+        
+        Текст подается в нарезку небольшими кусками, поэтому размер каждого
+        следующего чанка выбирается в момент, когда конвейер готов его
+        отправить, - по самым свежим замерам скорости сервера.
+        """
+        segmenter = SentenceSegmenter(self.sizer.first_chunk_size)
+        step = max(1, self.sizer.min_chunk_size)
+        for start in range(0, len(text), step):
+            for chunk in segmenter.feed(text[start:start + step]):
+                yield chunk
+                segmenter.max_chunk_size = self.sizer.next_size(voice, language, len(chunk))
+        for chunk in segmenter.flush():
+            yield chunk
+    
+    def _start_chunk_job(
+        self,
+        chunk: str,
+        voice: str,
+        language: str,
+        incremental: bool,
+        priority: str = "normal",
+        tenant: str = None
+    ):
+        """
+        Запускает синтез чанка в фоне
+        
+        Returns:
+            (задача, очередь кадров) - очередь есть только в потоковом режиме,
+            ее размер ограничивает память, занятую чанком, который еще не играет
+        """
+        if not incremental:
+            return asyncio.ensure_future(
+                self.synthesize_chunk(chunk, voice, language, priority=priority, tenant=tenant)
+            ), None
+        
+        frames: asyncio.Queue = asyncio.Queue(maxsize=self.config.config['stream_buffer_frames'])
+        
+        async def pump():
+            try:
+                async for frame in self.stream_tts_chunk_iter(
+                    chunk, voice, language, priority=priority, tenant=tenant
+                ):
+                    await frames.put(frame)
+            except asyncio.CancelledError:
+                # Будим потребителя, если он ждет кадр (при отмене потока)
+                if not frames.full():
+                    frames.put_nowait(None)
+                raise
+            except BaseException:
+                await frames.put(None)
+                raise
+            await frames.put(None)
+        
+        return asyncio.ensure_future(pump()), frames
+    
+    def _chunk_failed(self, error: TTSChunkError) -> None:
+        """Пропускает чанк с ошибкой или прерывает поток, в зависимости от конфигурации"""
+        if not self.config.config['skip_failed_chunks']:
+            raise error
+        logger.warning(f"⚠️ Чанк пропущен: {error}")
+    
+    async def _synthesize_ordered(
+        self,
+        texts: AsyncIterator[str],
+        voice: str,
+        language: str,
+        max_concurrency: int,
+        incremental: bool = False,
+        priority: str = "normal",
+        tenant: str = None,
+        cancel: Optional[CancelHandle] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Конвейерная генерация TTS: до max_concurrency запросов одновременно
+        через общую сессию, аудио отдается строго в исходном порядке чанков
+        
+        Args:
+            texts: Асинхронный итератор чанков текста
+            voice: Голос для использования
+            language: Язык
+            max_concurrency: Максимальное число чанков в работе
+            incremental: Отдавать кадры по мере прихода вместо целых чанков
+            priority: Класс приоритета планировщика для всех чанков
+            tenant: Арендатор для честной очереди
+            cancel: Ручка отмены - поток закончится сразу после cancel()
+            
+        Yields:
+            Аудиоданные (чанки или кадры) в порядке следования текста
+        """
+        max_concurrency = max(1, int(max_concurrency))
+        slots = asyncio.Semaphore(max_concurrency)
+        ordered: asyncio.Queue = asyncio.Queue()
+        done = object()
+        
+        async def dispatch():
+            # Запускаем запросы заранее, пока есть свободные слоты
+            try:
+                async for chunk in texts:
+                    if not chunk.strip():
+                        continue
+                    await slots.acquire()
+                    ordered.put_nowait((chunk, self._start_chunk_job(
+                        chunk, voice, language, incremental, priority, tenant
+                    )))
+            except Exception as e:
+                ordered.put_nowait((done, e))
+                return
+            ordered.put_nowait((done, None))
+        
+        # Паузы между чанками: от момента, когда потребитель доиграл чанк,
+        # до появления первого аудио следующего
+        started = time.perf_counter()
+        resumed = started
+        metrics = {"chunks": 0, "first_audio_delay": None, "chunk_gaps": []}
+        self.last_stream_metrics = metrics
+        
+        def audio_ready():
+            gap = time.perf_counter() - resumed
+            if metrics["chunks"] == 0:
+                metrics["first_audio_delay"] = gap
+            else:
+                metrics["chunk_gaps"].append(gap)
+            metrics["chunks"] += 1
+        
+        dispatcher = asyncio.ensure_future(dispatch())
+        pending: "collections.deque[asyncio.Future]" = collections.deque()
+        
+        def abort():
+            # Отмена извне: новые чанки не запускаем, запросы в работе рвем,
+            # потребителя будим маркером конца
+            dispatcher.cancel()
+            while not ordered.empty():
+                chunk, job = ordered.get_nowait()
+                if chunk is not done:
+                    job[0].cancel()
+            for task in pending:
+                task.cancel()
+            ordered.put_nowait((done, None))
+            metrics["cancelled"] = True
+            logger.info(f"🛑 Поток отменен: {cancel.reason}")
+        
+        if cancel is not None:
+            cancel.add_callback(abort)
+        try:
+            while True:
+                chunk, job = await ordered.get()
+                if chunk is done:
+                    # job здесь - ошибка итератора текста (или None)
+                    if job is not None:
+                        raise job
+                    break
+                task, frames = job
+                pending.append(task)
+                if frames is None:
+                    try:
+                        result = await task
+                    except asyncio.CancelledError:
+                        if cancel is not None and cancel.cancelled and task.cancelled():
+                            break
+                        raise
+                    finally:
+                        pending.popleft()
+                        slots.release()
+                    if not result.ok:
+                        self._chunk_failed(TTSChunkError(result))
+                    elif result.audio:
+                        audio_ready()
+                        yield result.audio
                 else:
-                    logger.error(f"❌ Ошибка TTS API: {response.status}")
-                    error_text = await response.text()
-                    logger.error(f"❌ Ответ сервера: {error_text}")
-                    return b""
-                    
-        except Exception as e:
-            logger.error(f"❌ Ошибка при генерации TTS: {e}")
-            return b""
+                    # Головной чанк играет вживую, следующие копят не больше
+                    # stream_buffer_frames кадров
+                    try:
+                        first_frame = True
+                        while True:
+                            frame = await frames.get()
+                            if frame is None:
+                                break
+                            if first_frame:
+                                audio_ready()
+                                first_frame = False
+                            yield frame
+                            if cancel is not None and cancel.cancelled:
+                                break
+                        if cancel is not None and cancel.cancelled:
+                            break
+                        try:
+                            await task
+                        except TTSChunkError as e:
+                            self._chunk_failed(e)
+                    finally:
+                        pending.popleft()
+                        slots.release()
+                resumed = time.perf_counter()
+        finally:
+            if cancel is not None:
+                cancel.remove_callback(abort)
+            # Генератор закрыт досрочно - отменяем все, что еще в работе
+            dispatcher.cancel()
+            while not ordered.empty():
+                chunk, job = ordered.get_nowait()
+                if chunk is not done:
+                    pending.append(job[0])
+            for task in pending:
+                task.cancel()
+            
+            gaps = metrics["chunk_gaps"]
+            metrics["max_chunk_gap"] = max(gaps) if gaps else 0.0
+            metrics["avg_chunk_gap"] = sum(gaps) / len(gaps) if gaps else 0.0
+            metrics["total_time"] = time.perf_counter() - started
+            if metrics["chunks"]:
+                logger.info(
+                    f"📊 Чанков: {metrics['chunks']}, первое аудио через "
+                    f"{metrics['first_audio_delay']:.2f}с, макс. пауза между чанками "
+                    f"{metrics['max_chunk_gap']:.2f}с"
+                )
     
     async def generate_tts_from_text(
         self,
         text: str,
         voice: str = None,
         language: str = None,
-        max_chunk_size: int = None
+        max_chunk_size: int = None,
+        max_concurrency: int = None,
+        incremental: bool = False,
+        priority: str = "normal",
+        tenant: str = None,
+        cancel: CancelHandle = None
     ) -> AsyncIterator[bytes]:
         """
         Генерирует TTS из статического текста, разбитого на чанки
+        
+        Чанки синтезируются конвейером: одновременно в работе до
+        max_concurrency запросов, аудио отдается в исходном порядке
+        сразу после готовности очередного чанка. С incremental=True
+        отдаются сетевые кадры, а не целые чанки: каждый чанк начинается
+        с собственного WAV заголовка. С adaptive_chunking в конфигурации
+        размер чанков подбирает ChunkSizer, а max_chunk_size не используется.
+        Для длинной озвучки передавайте priority="batch", чтобы она не
+        вытесняла живые разговоры. После cancel.cancel() поток заканчивается.
         """
         voice = voice or self.config.config['default_voice']
         language = language or self.config.config['default_language']
         max_chunk_size = max_chunk_size or self.config.config['default_chunk_size']
+        max_concurrency = max_concurrency or self.config.config['max_concurrent_chunks']
         
-        chunks = self.chunk_text(text, max_chunk_size)
-        logger.info(f"📝 Разбито на {len(chunks)} чанков")
+        if self.config.config['adaptive_chunking']:
+            async def iterate_chunks():
+                i = 0
+                async for chunk in self._adaptive_chunks(text, voice, language):
+                    i += 1
+                    logger.info(f"🎵 Обрабатываем чанк {i} ({len(chunk)} симв.): '{chunk[:30]}...'")
+                    yield chunk
+        else:
+            chunks = self.chunk_text(text, max_chunk_size)
+            logger.info(f"📝 Разбито на {len(chunks)} чанков")
+            
+            async def iterate_chunks():
+                for i, chunk in enumerate(chunks, 1):
+                    logger.info(f"🎵 Обрабатываем чанк {i}/{len(chunks)}: '{chunk[:30]}...'")
+                    yield chunk
         
-        for i, chunk in enumerate(chunks, 1):
-            if chunk.strip():
-                logger.info(f"🎵 Обрабатываем чанк {i}/{len(chunks)}: '{chunk[:30]}...'")
-                audio_data = await self.stream_tts_chunk(chunk, voice, language)
-                if audio_data:
-                    yield audio_data
-                    # Небольшая задержка между чанками
-                    await asyncio.sleep(0.1)
+        stream = self._synthesize_ordered(
+            iterate_chunks(), voice, language, max_concurrency, incremental, priority, tenant, cancel
+        )
+        try:
+            async for audio_data in stream:
+                yield audio_data
+        finally:
+            # Закрываем явно, чтобы отменить запросы сразу, а не при сборке мусора
+            await stream.aclose()
+    
+    async def generate_tts_to_file(
+        self,
+        text: str,
+        output_path: str,
+        voice: str = None,
+        language: str = None,
+        max_chunk_size: int = None,
+        max_concurrency: int = None,
+        priority: str = "normal",
+        tenant: str = None,
+        cancel: CancelHandle = None
+    ) -> Dict[str, Any]:
+        """
+        Генерирует TTS из текста прямо в WAV файл с единственным заголовком
+        
+        Кадры пишутся на диск по мере прихода, поэтому память не растет
+        с длиной текста.
+        
+        Returns:
+            Словарь со статистикой: чанков, байт PCM, длительность в секундах
+        """
+        with WavAssembler(output_path) as assembler:
+            async for frame in self.generate_tts_from_text(
+                text, voice, language, max_chunk_size, max_concurrency, incremental=True,
+                priority=priority, tenant=tenant, cancel=cancel
+            ):
+                assembler.feed(frame)
+        
+        logger.info(f"💾 Сохранено {assembler.duration:.1f}с аудио в {output_path}")
+        return {
+            "chunks": assembler.chunks,
+            "data_bytes": assembler.data_bytes,
+            "duration": assembler.duration,
+        }
     
     async def stream_tts_from_iterator(
         self,
@@ -250,71 +1373,243 @@ class TTSStreamingClient:
         voice: str = None,
         language: str = None,
         max_chunk_size: int = None,
-        chunk_timeout: float = 2.0
+        chunk_timeout: float = 2.0,
+        incremental: bool = False,
+        max_concurrency: int = None,
+        priority: str = "interactive",
+        tenant: str = None,
+        cancel: CancelHandle = None
     ) -> AsyncIterator[bytes]:
         """
         Генерирует TTS из итератора текста (например, от Ollama)
+        
+        Чтение токенов и синтез идут параллельно: фоновая задача вычитывает
+        итератор и нарезает предложения в ограниченную очередь, а конвейер
+        запрашивает TTS для следующих чанков, пока играет текущий. Аудио
+        отдается в исходном порядке, паузы между чанками попадают в
+        last_stream_metrics. С incremental=True аудио отдается сетевыми
+        кадрами по мере прихода. По умолчанию чанки идут в планировщик
+        с приоритетом interactive.
+        
+        Перебивание пользователем: передайте CancelHandle и вызовите
+        cancel() - чтение итератора прекратится, чанки из очереди снимутся,
+        ответы в работе закроются, а серверу уйдет /api/stop-generation.
         """
         voice = voice or self.config.config['default_voice']
         language = language or self.config.config['default_language']
         max_chunk_size = max_chunk_size or self.config.config['default_chunk_size']
+        max_concurrency = max_concurrency or self.config.config['max_concurrent_chunks']
         
-        buffer = ""
-        last_update_time = time.time()
+        # Очередь ограничена, чтобы нарезка не убегала далеко вперед синтеза
+        ready_chunks: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+        done = object()
         
-        async for text_part in text_iterator:
-            buffer += text_part
-            current_time = time.time()
-            
-            # Проверяем, нужно ли отправить чанк
-            should_send = False
-            
-            # Если буфер содержит завершенное предложение
-            if re.search(r'[.!?]+\s+', buffer):
-                should_send = True
-            # Если буфер слишком большой
-            elif len(buffer) > max_chunk_size:
-                should_send = True
-            # Если прошло слишком много времени с последнего обновления
-            elif current_time - last_update_time > chunk_timeout and buffer.strip():
-                should_send = True
-            
-            if should_send:
-                chunks = self.chunk_text(buffer, max_chunk_size)
-                
-                # Обрабатываем все чанки кроме последнего (который может быть неполным)
-                for chunk in chunks[:-1]:
-                    if chunk.strip():
-                        audio_data = await self.stream_tts_chunk(chunk, voice, language)
-                        if audio_data:
-                            yield audio_data
+        adaptive = self.config.config['adaptive_chunking']
+        
+        async def produce():
+            segmenter = SentenceSegmenter(self.sizer.first_chunk_size if adaptive else max_chunk_size)
+            last_update_time = time.time()
+            source = text_iterator.__aiter__()
+            next_part = None
+            try:
+                while True:
+                    if next_part is None:
+                        next_part = asyncio.ensure_future(source.__anext__())
+                    # Ждем токен не дольше chunk_timeout, не отменяя само чтение
+                    await asyncio.wait({next_part}, timeout=chunk_timeout)
+                    current_time = time.time()
+                    
+                    if next_part.done():
+                        part, next_part = next_part, None
+                        try:
+                            chunks = segmenter.feed(part.result())
+                        except StopAsyncIteration:
+                            break
+                    elif segmenter.pending:
+                        # Итератор замолчал - отправляем накопленный текст до
+                        # границы слова: хвост может оказаться началом слова
+                        chunks = segmenter.flush_words()
+                    else:
+                        chunks = []
+                    
+                    # Если прошло слишком много времени с последней отправки,
+                    # отдаем законченные предложения, не дожидаясь заполнения чанка
+                    if not chunks and current_time - last_update_time > chunk_timeout:
+                        chunks = segmenter.drain()
+                    
+                    for chunk in chunks:
+                        await ready_chunks.put(chunk)
+                    if chunks:
+                        last_update_time = current_time
+                        if adaptive:
+                            segmenter.max_chunk_size = self.sizer.next_size(voice, language, len(chunks[-1]))
                 
-                # Оставляем последний чанк в буфере
-                buffer = chunks[-1] if chunks else ""
-                last_update_time = current_time
-        
-        # Обрабатываем оставшийся текст в буфере
-        if buffer.strip():
-            final_chunks = self.chunk_text(buffer, max_chunk_size)
-            for chunk in final_chunks:
-                if chunk.strip():
-                    audio_data = await self.stream_tts_chunk(chunk, voice, language)
-                    if audio_data:
-                        yield audio_data
+                # Отправляем оставшийся текст
+                for chunk in segmenter.flush():
+                    await ready_chunks.put(chunk)
+            except Exception as e:
+                await ready_chunks.put(e)
+            finally:
+                if next_part is not None:
+                    next_part.cancel()
+            await ready_chunks.put(done)
+        
+        async def consume_chunks():
+            while True:
+                item = await ready_chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        
+        producer = asyncio.ensure_future(produce())
+        stream = self._synthesize_ordered(
+            consume_chunks(), voice, language, max_concurrency, incremental, priority, tenant, cancel
+        )
+        if cancel is not None:
+            cancel.add_callback(producer.cancel)
+        try:
+            async for audio_data in stream:
+                yield audio_data
+        finally:
+            if cancel is not None:
+                cancel.remove_callback(producer.cancel)
+            await stream.aclose()
+            producer.cancel()
 
 
 # Синхронная версия для быстрого использования
 class SyncTTSClient:
-    """Синхронная обертка для TTSStreamingClient"""
+    """
+    Синхронная обертка для TTSStreamingClient
+    
+    Один фоновый поток с циклом событий и одна сессия с пулом соединений
+    на весь объект. Методы можно вызывать из многих потоков одновременно:
+    запросы выполняются конкурентно в общем цикле.
+    """
     
     def __init__(self, config_file: str = "tts_config.json"):
-        self.config = TTSConfig(config_file)
+        self._client = TTSStreamingClient(config_file)
+        self.config = self._client.config
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def __enter__(self) -> "SyncTTSClient":
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+    
+    @property
+    def client(self) -> TTSStreamingClient:
+        """Асинхронный клиент, работающий в фоновом цикле"""
+        return self._client
     
     def chunk_text(self, text: str, max_chunk_size: int = None) -> List[str]:
         """Синхронная версия разбиения текста на чанки"""
         max_chunk_size = max_chunk_size or self.config.config['default_chunk_size']
-        client = TTSStreamingClient(self.config.config_file)
-        return client.chunk_text(text, max_chunk_size)
+        return self._client.chunk_text(text, max_chunk_size)
+    
+    def synthesize(
+        self,
+        text: str,
+        voice: str = None,
+        language: str = None,
+        max_chunk_size: int = None,
+        timeout: float = None
+    ) -> bytes:
+        """
+        Синтезирует текст целиком и возвращает один WAV с единым заголовком
+        
+        Raises:
+            TTSChunkError: если чанк не удалось синтезировать
+            concurrent.futures.TimeoutError: если не уложились в timeout
+        """
+        return self._run(self._synthesize_wav(text, voice, language, max_chunk_size), timeout)
+    
+    def stream(
+        self,
+        text: str,
+        voice: str = None,
+        language: str = None,
+        max_chunk_size: int = None,
+        incremental: bool = False
+    ) -> Iterator[bytes]:
+        """
+        Генератор аудио по мере готовности, как generate_tts_from_text
+        
+        Следующий чанк запрашивается, когда вызывающий поток забирает
+        предыдущий; закрытие генератора отменяет запросы в работе.
+        """
+        stream = self._client.generate_tts_from_text(
+            text, voice, language, max_chunk_size, incremental=incremental
+        )
+        try:
+            while True:
+                try:
+                    yield self._run(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            if self._loop is not None and self._loop.is_running():
+                self._run(stream.aclose())
+    
+    def close(self) -> None:
+        """Закрывает сессию и останавливает фоновый цикл"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self._client.__aexit__(None, None, None), loop
+            ).result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Цикл и сессия создаются при первом запросе и живут до close()
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="tts-client-loop", daemon=True
+                )
+                thread.start()
+                try:
+                    asyncio.run_coroutine_threadsafe(self._client.__aenter__(), loop).result()
+                except BaseException:
+                    loop.call_soon_threadsafe(loop.stop)
+                    thread.join()
+                    loop.close()
+                    raise
+                self._loop, self._thread = loop, thread
+            return self._loop
+    
+    def _run(self, coro, timeout: float = None):
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("SyncTTSClient нельзя вызывать из его собственного цикла событий")
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+    
+    async def _synthesize_wav(self, text, voice, language, max_chunk_size) -> bytes:
+        output = io.BytesIO()
+        with WavAssembler(output) as assembler:
+            async for frame in self._client.generate_tts_from_text(
+                text, voice, language, max_chunk_size, incremental=True
+            ):
+                assembler.feed(frame)
+        return output.getvalue()
 
 
 # Функция для простого тестирования
@@ -337,4 +1632,5 @@ async def simple_test():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(simple_test())
@@ -0,0 +1,24 @@
+"""
+Исключения клиента AllTalk TTS
+"""
+
+
+class TTSError(Exception):
+    """Базовая ошибка клиента TTS"""
+
+
+class TTSChunkError(TTSError):
+    """Чанк не удалось синтезировать после всех попыток"""
+
+    def __init__(self, result):
+        self.result = result
+        super().__init__(f"Не удалось синтезировать '{result.text[:50]}': {result.error}")
+
+
+class TTSOverloadError(TTSError):
+    """Очередь к серверу переполнена - запрос отклонен без ожидания"""
+
+    def __init__(self, priority: str, queued: int):
+        self.priority = priority
+        self.queued = queued
+        super().__init__(f"Очередь TTS переполнена: впереди {queued} запросов (приоритет {priority})")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+🧪 Локальная имитация сервера AllTalk для тестов и бенчмарков
+Отдает WAV поток с настраиваемой задержкой синтеза на символ, джиттером
+и частотой кадров. Запуск отдельно: python fake_server.py --port 7851
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import struct
+from typing import Optional, Set
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+def wav_header(data_size: int, sample_rate: int = 24000) -> bytes:
+    """Заголовок WAV: 16 бит, моно"""
+    byte_rate = sample_rate * 2
+    return (
+        b"RIFF" + struct.pack("<I", (36 + data_size) & 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, byte_rate, 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+class FakeAllTalkServer:
+    """
+    Имитация AllTalk на aiohttp
+
+    Время синтеза чанка: base_latency + per_char_latency * длина текста,
+    растянутое на +-jitter. Первый кадр уходит через base_latency, остальные
+    аудиоданные - кадрами frame_bytes с интервалом, укладывающим весь синтез
+    в расчетное время (но не чаще frame_interval).
+    """
+
+    def __init__(
+        self,
+        per_char_latency: float = 0.002,
+        base_latency: float = 0.05,
+        jitter: float = 0.1,
+        frame_interval: float = 0.02,
+        frame_bytes: int = 4096,
+        audio_per_char: float = 0.06,
+        sample_rate: int = 24000,
+        gpu_slots: Optional[int] = None,
+        unknown_length: bool = False,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            per_char_latency: Время синтеза одного символа, секунды
+            base_latency: Постоянная задержка до первого аудио, секунды
+            jitter: Относительный разброс времени синтеза (0.1 = +-10%)
+            frame_interval: Минимальный интервал между кадрами, секунды
+            frame_bytes: Размер кадра PCM в байтах
+            audio_per_char: Длительность речи на символ текста, секунды
+            sample_rate: Частота дискретизации
+            gpu_slots: Сколько синтезов идут одновременно (None - без ограничения)
+            unknown_length: Ставить в заголовок неизвестный размер, как потоковый XTTS
+            seed: Зерно генератора джиттера
+        """
+        self.per_char_latency = per_char_latency
+        self.base_latency = base_latency
+        self.jitter = jitter
+        self.frame_interval = frame_interval
+        self.frame_bytes = frame_bytes
+        self.audio_per_char = audio_per_char
+        self.sample_rate = sample_rate
+        self.unknown_length = unknown_length
+        self.ready = True
+        self.voices = ["Arnold.wav", "female_01.wav", "male_01.wav"]
+        self.model = "xtts - xttsv2_2.0.3"
+        self.requests = 0
+        self.stopped = 0
+        self.url = ""
+        self._gpu = asyncio.Semaphore(gpu_slots) if gpu_slots else None
+        self._random = random.Random(seed)
+        self._active: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/tts-generate-streaming", self._tts)
+        app.router.add_get("/api/ready", self._ready)
+        app.router.add_get("/api/voices", self._voices)
+        app.router.add_get("/api/currentsettings", self._settings)
+        app.router.add_put("/api/stop-generation", self._stop)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeAllTalkServer":
+        """Запускает сервер; port=0 - выбрать свободный"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def address(self) -> str:
+        """Адрес в формате api_alltalk_ip_port"""
+        return self.url.split("://", 1)[1]
+
+    def synthesis_time(self, text: str) -> float:
+        spread = 1.0 + self._random.uniform(-self.jitter, self.jitter)
+        return (self.base_latency + self.per_char_latency * len(text)) * spread
+
+    async def _ready(self, request):
+        return web.Response(text="Ready" if self.ready else "Unloaded")
+
+    async def _voices(self, request):
+        return web.json_response({"status": "success", "voices": self.voices})
+
+    async def _settings(self, request):
+        return web.json_response({
+            "current_engine_loaded": "xtts",
+            "current_model_loaded": self.model,
+            "audio_format": "wav",
+            "streaming_capable": True,
+            "languages_capable": True,
+        })
+
+    async def _stop(self, request):
+        # Как и настоящий сервер, прерываем текущую генерацию целиком
+        self.stopped += 1
+        for task in list(self._active):
+            task.cancel()
+        return web.json_response({"message": "Cancelling current TTS generation"})
+
+    async def _tts(self, request):
+        text = request.query.get("text", "")
+        if not text or request.query.get("voice") not in self.voices:
+            return web.Response(status=400, text="Unknown voice or empty text")
+        if self._gpu is None:
+            return await self._synthesize(request, text)
+        async with self._gpu:
+            return await self._synthesize(request, text)
+
+    async def _synthesize(self, request, text: str):
+        self.requests += 1
+        total_time = self.synthesis_time(text)
+        samples = int(len(text) * self.audio_per_char * self.sample_rate)
+        data_size = samples * 2
+        frames = max(1, -(-data_size // self.frame_bytes))
+        interval = max(self.frame_interval, (total_time - self.base_latency) / frames)
+
+        task = asyncio.current_task()
+        self._active.add(task)
+        response = web.StreamResponse(headers={"Content-Type": "audio/wav"})
+        try:
+            await asyncio.sleep(self.base_latency)
+            await response.prepare(request)
+            await response.write(wav_header(0xFFFFFFFF if self.unknown_length else data_size, self.sample_rate))
+            sent = 0
+            while sent < data_size:
+                size = min(self.frame_bytes, data_size - sent)
+                await response.write(b"\x00" * size)
+                sent += size
+                if sent < data_size:
+                    await asyncio.sleep(interval)
+            await response.write_eof()
+        except ConnectionResetError:
+            # Клиент закрыл поток досрочно
+            pass
+        finally:
+            self._active.discard(task)
+        return response
+
+
+async def serve(args) -> None:
+    server = FakeAllTalkServer(
+        per_char_latency=args.per_char_latency,
+        base_latency=args.base_latency,
+        jitter=args.jitter,
+        frame_interval=args.frame_interval,
+        gpu_slots=args.gpu_slots,
+    )
+    await server.start(args.host, args.port)
+    logger.info(f"🎭 Имитация AllTalk слушает {server.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная имитация сервера AllTalk")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7851)
+    parser.add_argument("--per-char-latency", type=float, default=0.002)
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--frame-interval", type=float, default=0.02)
+    parser.add_argument("--gpu-slots", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Отложенный импорт тяжелых зависимостей
+Модуль загружается при первом обращении к его атрибуту, поэтому
+import client не тянет aiohttp, пока клиент не начал работать с сетью
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Возвращает модуль, который выполнится при первом обращении к атрибуту
+
+    Уже загруженный модуль возвращается как есть.
+
+    Raises:
+        ModuleNotFoundError: если модуль не установлен (проверяется сразу)
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
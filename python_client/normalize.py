@@ -0,0 +1,430 @@
+"""
+Нормализация текста чанка перед отправкой на сервер TTS
+Убирает разметку markdown, лишние пробелы и символы, которые сервер
+синтезирует впустую, раскрывает сокращения и пишет числа словами
+(русский и английский). Одинаковые по смыслу фразы дают одинаковый
+текст запроса и попадают в один ключ кэша и объединения запросов.
+"""
+
+import functools
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+# --- Разметка и символы (для всех языков) ---
+
+_CODE_FENCE = re.compile(r"```[^\n]*\n?|~~~[^\n]*\n?")
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_URL = re.compile(r"(?:https?://|www\.)\S+")
+_HTML_TAG = re.compile(r"</?[A-Za-z][^>]*>")
+_LINE_MARKUP = re.compile(r"^[ \t]*(?:#{1,6}[ \t]+|>[ \t]?|[-*+][ \t]+|[-*_]{3,}[ \t]*$)", re.MULTILINE)
+# Номер пункта снимается, только если пунктов в тексте несколько:
+# "42. Ответ" в начале чанка - число, а не разметка
+_NUMBERED_ITEM = re.compile(r"^[ \t]*\d+[.)][ \t]+", re.MULTILINE)
+# Выделение только на границах слов: "snake_case_name" и "2*3*4" - не разметка
+_EMPHASIS = re.compile(r"(?<!\w)(\*{1,3}|_{1,3}|~~)(?=\S)(.+?)(?<=\S)\1(?!\w)")
+_INLINE_CODE = re.compile(r"`([^`]*)`")
+# Эмодзи, пиктограммы, селекторы вариантов и соединители
+_EMOJI = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\u20E3]")
+# Знак операции между операндами, пробелы с обеих сторон одинаковые:
+# "2*3", "a < b", "x >= 0", но не сноска "Звезда* в тексте"
+_OPERAND_AROUND = r"(?<=[\w)]){0}(?=[\w(])|(?<=[\w)] ){0}(?= [\w(])"
+_OPERATOR = re.compile(_OPERAND_AROUND.format(r"(\*|<=|>=|<|>)"))
+# Символы, которые сервер либо читает вслух, либо тратит на них время;
+# "*" между операндами остается (для ru и en он уже раскрыт словами),
+# "<" и ">" - тоже: теги HTML сняты раньше
+_NOISE = re.compile(
+    r"[_#`~|\\^{}\[\]•·▪►■□◆◇]+|(?!" + _OPERAND_AROUND.format(r"\*") + r")\*+"
+)
+_REPEATED_PUNCT = re.compile(r"([!?,;:])\1+|\.{4,}")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([.,!?;:…])")
+_WHITESPACE = re.compile(r"\s+")
+
+# --- Числа ---
+
+_TIME = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+# Группы разрядов: "1 000 000" (пробел или неразрывный) и "1,000,000" для английского.
+# Серия групп через пробел должна целиком состоять из троек после первой
+# группы: "8 800 555 35 35" - телефон, а не восемь миллионов
+_GROUPED_SPACE = re.compile(
+    r"(?<![\w.,])(?<!\d[ \u00A0\u202F])\d{1,3}(?:[ \u00A0\u202F]\d{3})+"
+    r"(?![\w]|[.,]\d|[ \u00A0\u202F]\d)"
+)
+# "$5" читается как "пять долларов"
+_PREFIX_CURRENCY = re.compile(r"([$€])\s?(?=\d)(\d+(?:[.,]\d+)?)")
+_GROUPED_COMMA = re.compile(r"(?<![\w.,])\d{1,3}(?:,\d{3})+(?![\w]|[.,]\d)")
+
+# Длиннее триллионов число читаем по цифрам (номера, коды)
+_MAX_DIGITS = 15
+
+_RU_UNITS = ("ноль", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять")
+_RU_UNITS_FEMININE = ("ноль", "одна", "две") + _RU_UNITS[3:]
+_RU_TEENS = (
+    "десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать",
+    "пятнадцать", "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать",
+)
+_RU_TENS = ("", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто")
+_RU_HUNDREDS = ("", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот")
+# (формы для 1, 2-4, 5+; женский род)
+_RU_SCALES = (
+    (("тысяча", "тысячи", "тысяч"), True),
+    (("миллион", "миллиона", "миллионов"), False),
+    (("миллиард", "миллиарда", "миллиардов"), False),
+    (("триллион", "триллиона", "триллионов"), False),
+)
+
+_EN_UNITS = (
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+    "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+    "seventeen", "eighteen", "nineteen",
+)
+_EN_TENS = ("", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety")
+_EN_SCALES = ("thousand", "million", "billion", "trillion")
+
+# --- Сокращения и символы по языкам ---
+
+_ABBREVIATIONS: Dict[str, Dict[str, str]] = {
+    "ru": {
+        "т.е.": "то есть",
+        "т. е.": "то есть",
+        "т.к.": "так как",
+        "т. к.": "так как",
+        "и т.д.": "и так далее",
+        "и т. д.": "и так далее",
+        "и т.п.": "и тому подобное",
+        "и т. п.": "и тому подобное",
+        "и др.": "и другие",
+        "др.": "другие",
+        "напр.": "например",
+        "ул.": "улица",
+    },
+    "en": {
+        "e.g.": "for example",
+        "i.e.": "that is",
+        "etc.": "et cetera",
+        "vs.": "versus",
+        "Mr.": "Mister",
+        "Mrs.": "Missus",
+        "Dr.": "Doctor",
+        "approx.": "approximately",
+    },
+}
+
+# Сокращения, которые раскрываются только перед числом: "No. 5", но не "No. That is wrong."
+_NUMBER_ABBREVIATIONS: Dict[str, Dict[str, str]] = {
+    "ru": {},
+    "en": {"No.": "number"},
+}
+
+# Обращения и адреса перед именем: "Dr. Smith", "ул. Ленина" - точка не конец
+# предложения, если дальше не местоимение или служебное слово
+_NAME_PREFIXES = {"Mr.", "Mrs.", "Dr.", "ул."}
+_SENTENCE_STARTERS: Dict[str, "re.Pattern"] = {
+    "ru": re.compile(r"\s+(?:Я|Мы|Вы|Ты|Он|Она|Оно|Они|Это|Там|Тут|Потом|Но|А|И)\b"),
+    "en": re.compile(r"\s+(?:I|We|You|He|She|It|They|This|That|There|The|A|An|But|And)\b"),
+}
+# После сокращения с точкой начинается новое предложение
+_SENTENCE_AFTER = re.compile(r"\s*$|\s+[A-ZА-ЯЁ]")
+
+# Единицы после чисел: формы для 1, 2-4, 5+ (в английском - 1 и остальные)
+_UNITS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "ru": {
+        "%": ("процент", "процента", "процентов"),
+        "руб.": ("рубль", "рубля", "рублей"),
+        "руб": ("рубль", "рубля", "рублей"),
+        "₽": ("рубль", "рубля", "рублей"),
+        "коп.": ("копейка", "копейки", "копеек"),
+        "$": ("доллар", "доллара", "долларов"),
+        "€": ("евро", "евро", "евро"),
+        "тыс.": ("тысяча", "тысячи", "тысяч"),
+        "млн": ("миллион", "миллиона", "миллионов"),
+        "млрд": ("миллиард", "миллиарда", "миллиардов"),
+        "кг": ("килограмм", "килограмма", "килограммов"),
+        "км": ("километр", "километра", "километров"),
+        # Без точки: точка после "5 см." - конец предложения
+        "см": ("сантиметр", "сантиметра", "сантиметров"),
+        "мин.": ("минута", "минуты", "минут"),
+        "сек.": ("секунда", "секунды", "секунд"),
+    },
+    "en": {
+        "%": ("percent", "percent"),
+        "$": ("dollar", "dollars"),
+        "€": ("euro", "euros"),
+        "kg": ("kilogram", "kilograms"),
+        "km": ("kilometer", "kilometers"),
+        "min": ("minute", "minutes"),
+        "sec": ("second", "seconds"),
+    },
+}
+
+# Единицы женского рода: "одна тысяча", "две минуты"
+_FEMININE_UNITS = {"тыс.", "коп.", "мин.", "сек."}
+
+_OPERATORS: Dict[str, Dict[str, str]] = {
+    "ru": {"*": " умножить на ", "<": " меньше ", ">": " больше ", "<=": " меньше или равно ", ">=": " больше или равно "},
+    "en": {"*": " times ", "<": " less than ", ">": " greater than ", "<=": " less than or equal to ", ">=": " greater than or equal to "},
+}
+
+_SYMBOLS: Dict[str, Dict[str, str]] = {
+    "ru": {"&": " и ", "%": " процентов ", "№": " номер ", "§": " параграф ", "°": " градусов ", "+": " плюс ", "=": " равно ", "@": " собака "},
+    "en": {"&": " and ", "%": " percent ", "№": " number ", "§": " section ", "°": " degrees ", "+": " plus ", "=": " equals ", "@": " at "},
+}
+
+
+def _abbreviation_pattern(table: Dict[str, str], before_number: bool = False) -> Optional["re.Pattern"]:
+    if not table:
+        return None
+    # Длинные формы первыми, чтобы "и т.д." не разбилось на "т.д."
+    alternatives = "|".join(re.escape(key) for key in sorted(table, key=len, reverse=True))
+    tail = r"(?=\s?\d)" if before_number else r"(?!\w)"
+    return re.compile(rf"(?<!\w)(?:{alternatives}){tail}")
+
+
+def _number_pattern(units: Dict[str, Tuple[str, ...]]) -> "re.Pattern":
+    alternatives = "|".join(re.escape(unit) for unit in sorted(units, key=len, reverse=True))
+    # Необязательный минус только в начале слова, необязательная дробная
+    # часть и единица измерения сразу после числа
+    return re.compile(
+        rf"(?<![\w.,])(?:(?<=\s)-|^-)?(\d+)(?:[.,](\d+))?(?![\w]|[.,]\d)"
+        rf"(?:\s?({alternatives})(?!\w))?",
+        re.MULTILINE,
+    )
+
+
+_NUMBER_RULES = {language: _number_pattern(units) for language, units in _UNITS.items()}
+_ABBREVIATION_RULES = {language: _abbreviation_pattern(table) for language, table in _ABBREVIATIONS.items()}
+_NUMBER_ABBREVIATION_RULES = {
+    language: _abbreviation_pattern(table, before_number=True)
+    for language, table in _NUMBER_ABBREVIATIONS.items()
+}
+_SYMBOL_RULES = {
+    language: re.compile("|".join(re.escape(symbol) for symbol in table))
+    for language, table in _SYMBOLS.items()
+}
+
+
+def _sentence_dot(match: "re.Match", abbreviation: str, language: str) -> str:
+    """
+    Точка сокращения, которая заодно закрывает предложение ("100 руб.
+    Спасибо.", "и т.д." в конце чанка): раскрытая форма ее теряет, и два
+    предложения сливаются, поэтому точку возвращаем
+    """
+    if not abbreviation.endswith("."):
+        return ""
+    text, end = match.string, match.end()
+    if abbreviation in _NAME_PREFIXES:
+        ends = text[end:].strip() == "" or _SENTENCE_STARTERS[language].match(text, end)
+    else:
+        ends = _SENTENCE_AFTER.match(text, end)
+    return "." if ends else ""
+
+
+def _plural_ru(number: int, forms: Tuple[str, str, str]) -> str:
+    if 11 <= number % 100 <= 14:
+        return forms[2]
+    if number % 10 == 1:
+        return forms[0]
+    if 2 <= number % 10 <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def _ru_triplet(number: int, feminine: bool) -> List[str]:
+    words = []
+    hundreds, rest = divmod(number, 100)
+    if hundreds:
+        words.append(_RU_HUNDREDS[hundreds])
+    if 10 <= rest <= 19:
+        words.append(_RU_TEENS[rest - 10])
+    else:
+        tens, units = divmod(rest, 10)
+        if tens:
+            words.append(_RU_TENS[tens])
+        if units:
+            words.append((_RU_UNITS_FEMININE if feminine else _RU_UNITS)[units])
+    return words
+
+
+def _en_triplet(number: int) -> List[str]:
+    words = []
+    hundreds, rest = divmod(number, 100)
+    if hundreds:
+        words += [_EN_UNITS[hundreds], "hundred"]
+    if rest >= 20:
+        tens, units = divmod(rest, 10)
+        words.append(_EN_TENS[tens] + (f"-{_EN_UNITS[units]}" if units else ""))
+    elif rest:
+        words.append(_EN_UNITS[rest])
+    return words
+
+
+@functools.lru_cache(maxsize=4096)
+def number_to_words(digits: str, language: str, feminine: bool = False) -> str:
+    """
+    Целое число словами; результат запоминается - в текстах повторяются
+    одни и те же годы, суммы и номера
+
+    Args:
+        digits: Строка цифр
+        language: "ru" или "en"
+        feminine: Женский род последнего разряда (только для ru)
+    """
+    units = _RU_UNITS if language == "ru" else _EN_UNITS
+    if len(digits) > _MAX_DIGITS or (len(digits) > 1 and digits.startswith("0")):
+        # Коды и номера с ведущими нулями читаются по цифрам
+        return " ".join(units[int(d)] for d in digits)
+
+    number = int(digits)
+    if number == 0:
+        return units[0]
+
+    words: List[str] = []
+    triplets = []
+    while number:
+        number, triplet = divmod(number, 1000)
+        triplets.append(triplet)
+    for scale in range(len(triplets) - 1, -1, -1):
+        triplet = triplets[scale]
+        if not triplet:
+            continue
+        if language == "ru":
+            if scale == 0:
+                words += _ru_triplet(triplet, feminine)
+            else:
+                forms, scale_feminine = _RU_SCALES[scale - 1]
+                words += _ru_triplet(triplet, scale_feminine)
+                words.append(_plural_ru(triplet, forms))
+        else:
+            words += _en_triplet(triplet)
+            if scale:
+                words.append(_EN_SCALES[scale - 1])
+    return " ".join(words)
+
+
+def _unit_form(language: str, forms: Tuple[str, ...], integer: str, fraction: Optional[str]) -> str:
+    if language == "ru":
+        # Дробные: "две запятая пять процента"
+        return forms[1] if fraction else _plural_ru(int(integer[-2:]), forms)
+    return forms[0] if integer == "1" and not fraction else forms[1]
+
+
+def _number_replacer(language: str) -> Callable[["re.Match"], str]:
+    minus, point = ("минус", "запятая") if language == "ru" else ("minus", "point")
+    units = _UNITS[language]
+
+    def replace(match: "re.Match") -> str:
+        integer, fraction, unit = match.group(1), match.group(2), match.group(3)
+        feminine = unit in _FEMININE_UNITS and not fraction
+        words = number_to_words(integer, language, feminine)
+        if fraction:
+            words += f" {point} " + number_to_words(fraction, language)
+        if match.group(0).startswith("-"):
+            words = f"{minus} {words}"
+        if unit:
+            words += " " + _unit_form(language, units[unit], integer, fraction) + _sentence_dot(match, unit, language)
+        return words
+
+    return replace
+
+
+_NUMBER_REPLACERS = {language: _number_replacer(language) for language in ("ru", "en")}
+
+
+def _strip_markdown(text: str) -> str:
+    text = _CODE_FENCE.sub(" ", text)
+    text = _IMAGE.sub(r"\1", text)
+    text = _LINK.sub(r"\1", text)
+    text = _URL.sub(" ", text)
+    text = _HTML_TAG.sub(" ", text)
+    text = _LINE_MARKUP.sub("", text)
+    if len(_NUMBERED_ITEM.findall(text)) > 1:
+        text = _NUMBERED_ITEM.sub("", text)
+    text = _INLINE_CODE.sub(r"\1", text)
+    # Вложенное выделение (***жирный курсив*** внутри **...**) снимаем в несколько проходов
+    for _ in range(3):
+        text, count = _EMPHASIS.subn(r"\2", text)
+        if not count:
+            break
+    return text
+
+
+def _spell_numbers(text: str, language: str) -> str:
+    text = _TIME.sub(r"\1 \2", text)
+    text = _PREFIX_CURRENCY.sub(r"\2 \1", text)
+    text = _GROUPED_SPACE.sub(lambda m: re.sub(r"\D", "", m.group(0)), text)
+    if language == "en":
+        text = _GROUPED_COMMA.sub(lambda m: m.group(0).replace(",", ""), text)
+    return _NUMBER_RULES[language].sub(_NUMBER_REPLACERS[language], text)
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_text(text: str, language: str = "ru") -> str:
+    """
+    Нормализует текст одного чанка
+
+    Для ru и en раскрываются сокращения, символы и числа, для остальных
+    языков - только разметка, символы и пробелы. Повторяющиеся чанки
+    берутся из кэша результатов.
+    """
+    language = language.split("-")[0].lower()
+    text = _strip_markdown(text)
+    text = _EMOJI.sub("", text)
+
+    abbreviations = _ABBREVIATION_RULES.get(language)
+    if abbreviations is not None:
+        table = _ABBREVIATIONS[language]
+        text = abbreviations.sub(lambda m: table[m.group(0)] + _sentence_dot(m, m.group(0), language), text)
+        number_abbreviations = _NUMBER_ABBREVIATION_RULES[language]
+        if number_abbreviations is not None:
+            number_table = _NUMBER_ABBREVIATIONS[language]
+            # Пробел после: "No.5" -> "number 5"
+            text = number_abbreviations.sub(lambda m: number_table[m.group(0)] + " ", text)
+        text = _spell_numbers(text, language)
+        symbols = _SYMBOLS[language]
+        operators = _OPERATORS[language]
+        text = _OPERATOR.sub(lambda m: operators[m.group(m.lastindex)], text)
+        text = _SYMBOL_RULES[language].sub(lambda m: symbols[m.group(0)], text)
+
+    text = _NOISE.sub(" ", text)
+    text = _REPEATED_PUNCT.sub(lambda m: m.group(1) or "...", text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+    return text.strip()
+
+
+class TextNormalizer:
+    """
+    Нормализатор клиента со статистикой: сколько символов пришло и
+    сколько ушло на сервер после нормализации
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.calls = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def __call__(self, text: str, language: str) -> str:
+        if not self.enabled:
+            return text
+        normalized = normalize_text(text, language)
+        self.calls += 1
+        self.chars_in += len(text)
+        self.chars_out += len(normalized)
+        return normalized
+
+    @property
+    def shrink(self) -> float:
+        """Доля символов, которые не ушли на сервер (отрицательная, если текст вырос)"""
+        return 1 - self.chars_out / self.chars_in if self.chars_in else 0.0
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        cache = normalize_text.cache_info()
+        return {
+            "calls": self.calls,
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+            "shrink": self.shrink,
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        }
@@ -0,0 +1,204 @@
+"""
+Планировщик запросов к серверу TTS: классы приоритета, честная очередь
+между арендаторами, общий лимит одновременных запросов и отказ при
+переполнении очереди
+"""
+
+import asyncio
+import collections
+import contextlib
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+from errors import TTSOverloadError
+
+# Классы приоритета: меньше значение - раньше обслуживается
+PRIORITIES = {
+    "interactive": 0,
+    "normal": 1,
+    "batch": 2,
+}
+INTERACTIVE = "interactive"
+DEFAULT_TENANT = "default"
+
+
+class Ticket:
+    """
+    Приоритет и арендатор одного запроса
+
+    Приоритет можно только поднять - например, когда к объединенному
+    пакетному запросу присоединяется интерактивный. Если запрос в этот
+    момент ждет в очереди, он переходит в очередь нового класса.
+    """
+
+    def __init__(self, priority: str = "normal", tenant: str = None):
+        Scheduler.level(priority)
+        self.priority = priority
+        self.tenant = tenant
+        # Перестановка ожидающего запроса, пока он в очереди планировщика
+        self._requeue: Optional[Callable[[], None]] = None
+
+    def escalate(self, priority: str, tenant: str = None) -> None:
+        """Поднимает приоритет, если новый выше текущего"""
+        if Scheduler.level(priority) >= Scheduler.level(self.priority):
+            return
+        self.priority = priority
+        self.tenant = tenant
+        if self._requeue is not None:
+            self._requeue()
+
+    def __repr__(self) -> str:
+        return f"Ticket({self.priority!r}, {self.tenant!r})"
+
+
+class Scheduler:
+    """
+    Допуск запросов к серверу
+
+    Свободный слот получает самый приоритетный класс, внутри класса
+    арендаторы обслуживаются по кругу, поэтому один большой заказ не
+    забирает все слоты. Часть слотов можно зарезервировать за интерактивным
+    классом, чтобы живой разговор не ждал окончания длинного пакетного чанка.
+    """
+
+    def __init__(self, max_concurrency: int = 0, max_queue_depth: int = 0, interactive_reserve: int = 0):
+        """
+        Args:
+            max_concurrency: Сколько запросов одновременно на сервере (0 - без ограничения)
+            max_queue_depth: Сколько запросов может ждать перед новым того же
+                или более высокого приоритета (0 - без ограничения)
+            interactive_reserve: Слоты, доступные только интерактивному классу
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.interactive_reserve = interactive_reserve
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Класс -> арендатор -> ожидающие; порядок арендаторов - очередь обхода
+        self._waiting: Dict[int, "collections.OrderedDict[str, Deque[asyncio.Future]]"] = {
+            level: collections.OrderedDict() for level in sorted(PRIORITIES.values())
+        }
+
+    @staticmethod
+    def level(priority: str) -> int:
+        try:
+            return PRIORITIES[priority]
+        except KeyError:
+            raise ValueError(f"Неизвестный приоритет {priority!r}, допустимо: {', '.join(PRIORITIES)}") from None
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        """Число ожидающих в классе (или во всех классах)"""
+        levels = [self.level(priority)] if priority else self._waiting
+        return sum(len(waiters) for level in levels for waiters in self._waiting[level].values())
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self, priority: str = "normal", tenant: str = None, ticket: Ticket = None
+    ) -> AsyncIterator[None]:
+        """Контекст одного запроса к серверу"""
+        await self.acquire(priority, tenant, ticket)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: str = "normal", tenant: str = None, ticket: Ticket = None) -> None:
+        """
+        Ждет свободный слот
+
+        Args:
+            priority: Класс приоритета
+            tenant: Арендатор для честной очереди внутри класса
+            ticket: Приоритет и арендатор вместо priority и tenant; повышение
+                приоритета билета переносит ожидающий запрос в новый класс
+
+        Raises:
+            TTSOverloadError: если очередь перед запросом длиннее max_queue_depth
+        """
+        if ticket is not None:
+            priority, tenant = ticket.priority, ticket.tenant
+        level = self.level(priority)
+        tenant = tenant or DEFAULT_TENANT
+        ahead = self._waiting_ahead(level)
+        if not ahead and self._has_room(level):
+            self.running += 1
+            self.admitted += 1
+            return
+        if self.max_queue_depth and ahead >= self.max_queue_depth:
+            self.rejected += 1
+            raise TTSOverloadError(priority, ahead)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._enqueue(level, tenant, waiter)
+        if ticket is not None:
+            ticket._requeue = lambda: self._requeue(waiter, ticket)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже выдан, но запрос отменили - возвращаем его
+                self.release()
+            else:
+                self._dequeue(waiter)
+            raise
+        finally:
+            if ticket is not None:
+                ticket._requeue = None
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.running -= 1
+        self._wake()
+
+    def _enqueue(self, level: int, tenant: str, waiter: asyncio.Future) -> None:
+        self._waiting[level].setdefault(tenant, collections.deque()).append(waiter)
+
+    def _dequeue(self, waiter: asyncio.Future) -> bool:
+        for tenants in self._waiting.values():
+            for tenant, queue in tenants.items():
+                if waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del tenants[tenant]
+                    return True
+        return False
+
+    def _requeue(self, waiter: asyncio.Future, ticket: Ticket) -> None:
+        # Повышенный запрос встает в конец очереди своего арендатора в новом классе
+        if waiter.done() or not self._dequeue(waiter):
+            return
+        self._enqueue(self.level(ticket.priority), ticket.tenant or DEFAULT_TENANT, waiter)
+        self._wake()
+
+    def _has_room(self, level: int) -> bool:
+        if not self.max_concurrency:
+            return True
+        limit = self.max_concurrency
+        if level != PRIORITIES[INTERACTIVE]:
+            limit -= self.interactive_reserve
+        return self.running < limit
+
+    def _waiting_ahead(self, level: int) -> int:
+        return sum(
+            len(waiters)
+            for waiting_level, tenants in self._waiting.items() if waiting_level <= level
+            for waiters in tenants.values()
+        )
+
+    def _wake(self) -> None:
+        for level, tenants in self._waiting.items():
+            while tenants and self._has_room(level):
+                # Первый арендатор в очереди обхода получает слот и уходит в конец
+                tenant, waiters = next(iter(tenants.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    tenants.move_to_end(tenant)
+                else:
+                    del tenants[tenant]
+                if waiter.done():
+                    continue
+                waiter.set_result(None)
+                self.running += 1
+            if tenants:
+                # Старший класс еще ждет - младшим слот не отдаем
+                return
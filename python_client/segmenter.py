@@ -0,0 +1,171 @@
+"""
+Инкрементальная нарезка потока текста на чанки для TTS
+Приоритеты разбиения те же, что у chunk_text: концы предложений,
+затем [;,], затем границы слов
+"""
+
+import re
+from typing import List
+
+# Те же границы, что использует TTSStreamingClient.chunk_text
+SENTENCE_END = re.compile(r'[.!?]+\s+')
+CLAUSE_END = re.compile(r'[;,]\s+')
+_WHITESPACE = (" ", "\n", "\t", "\r")
+
+
+class SentenceSegmenter:
+    """
+    Нарезает текст, поступающий кусками, на чанки не длиннее max_chunk_size
+
+    Хранит незавершенное предложение списком кусков (не длиннее
+    max_chunk_size) и ищет границы только в новом тексте, поэтому каждый
+    символ просматривается и копируется O(1) раз в амортизированном
+    смысле. Законченные предложения склеиваются в чанк, пока он помещается
+    в лимит. В отличие от chunk_text знаки препинания на границах
+    сохраняются - они нужны TTS для интонации.
+    """
+
+    def __init__(self, max_chunk_size: int = 100):
+        self.max_chunk_size = max_chunk_size
+        # Незавершенное предложение кусками, его длина и хвост из [.!?],
+        # с которого продолжится поиск конца предложения
+        self._pieces: List[str] = []
+        self._length = 0
+        self._carry = ""
+        # Законченные предложения текущего чанка
+        self._current: List[str] = []
+        self._current_len = 0
+
+    @property
+    def pending(self) -> bool:
+        """Есть ли текст, еще не отданный чанками"""
+        return bool(self._current) or any(piece.strip() for piece in self._pieces)
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Добавляет кусок текста
+
+        Returns:
+            Список готовых чанков (может быть пустым)
+        """
+        chunks: List[str] = []
+        start = 0
+        # Без [.!?] в куске и в хвосте конца предложения быть не может -
+        # обычный токен LLM проходит без запуска регулярного выражения
+        if self._carry or "." in text or "!" in text or "?" in text:
+            # Ищем только в новом куске; хвост [.!?] прошлого куска уже лежит
+            # в _pieces, поэтому позиции в scan смещены на длину _carry
+            offset = len(self._carry)
+            scan = self._carry + text if offset else text
+            for match in SENTENCE_END.finditer(scan):
+                end = match.end() - offset
+                if self._pieces:
+                    self._pieces.append(text[start:end])
+                    sentence = "".join(self._pieces).strip()
+                    self._pieces = []
+                    self._length = 0
+                else:
+                    sentence = text[start:end].strip()
+                start = end
+                if sentence:
+                    self._add_sentence(sentence, chunks)
+
+        rest = text[start:] if start else text
+        if rest:
+            self._pieces.append(rest)
+            self._length += len(rest)
+            if rest[-1] in ".!?":
+                run = rest[len(rest.rstrip(".!?")):]
+                self._carry = self._carry + run if run == rest and not start else run
+            else:
+                self._carry = ""
+        elif start:
+            self._carry = ""
+
+        limit = self.max_chunk_size
+        if self._length > limit:
+            tail = "".join(self._pieces).lstrip()
+            # Незавершенное предложение переросло лимит - режем по [;,] или словам
+            while len(tail) > limit:
+                cut = self._cut_point(tail, limit)
+                self._flush_current(chunks)
+                chunks.append(tail[:cut].strip())
+                tail = tail[cut:].lstrip()
+            self._pieces = [tail] if tail else []
+            self._length = len(tail)
+            self._carry = tail[len(tail.rstrip(".!?")):]
+        return chunks
+
+    def drain(self) -> List[str]:
+        """Отдает законченные предложения, оставляя незавершенный хвост"""
+        chunks: List[str] = []
+        self._flush_current(chunks)
+        return chunks
+
+    def flush_words(self) -> List[str]:
+        """
+        Отдает накопленный текст до последней границы слова
+
+        Хвост после последнего пробела может быть началом слова, которое
+        допишет следующий токен LLM ("по" + "жив" + "аете"), - он остается
+        в буфере и уйдет со следующим чанком.
+        """
+        text = "".join(self._pieces)
+        cut = max(text.rfind(ws) for ws in _WHITESPACE)
+        if cut < 0 or not text[:cut].strip():
+            return self.drain()
+        chunks: List[str] = []
+        head, rest = text[:cut].strip(), text[cut:].lstrip()
+        self._pieces = [rest] if rest else []
+        self._length = len(rest)
+        self._carry = rest[len(rest.rstrip(".!?")):]
+        self._add_sentence(head, chunks)
+        self._flush_current(chunks)
+        return chunks
+
+    def flush(self) -> List[str]:
+        """Отдает весь накопленный текст, включая незавершенное предложение"""
+        chunks: List[str] = []
+        tail = "".join(self._pieces).strip()
+        self._pieces = []
+        self._length = 0
+        self._carry = ""
+        if tail:
+            self._add_sentence(tail, chunks)
+        self._flush_current(chunks)
+        return chunks
+
+    def _add_sentence(self, sentence: str, chunks: List[str]) -> None:
+        limit = self.max_chunk_size
+        if len(sentence) > limit:
+            # Длинное предложение режем по [;,], затем по словам
+            self._flush_current(chunks)
+            while len(sentence) > limit:
+                cut = self._cut_point(sentence, limit)
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].lstrip()
+            if not sentence:
+                return
+
+        if self._current and self._current_len + 1 + len(sentence) > limit:
+            self._flush_current(chunks)
+        self._current.append(sentence)
+        self._current_len += len(sentence) + (1 if self._current_len else 0)
+
+    def _flush_current(self, chunks: List[str]) -> None:
+        if self._current:
+            chunks.append(" ".join(self._current))
+            self._current = []
+            self._current_len = 0
+
+    @staticmethod
+    def _cut_point(text: str, limit: int) -> int:
+        """Позиция разреза не дальше limit: после [;,], иначе на пробеле"""
+        cut = 0
+        for match in CLAUSE_END.finditer(text, 0, limit + 1):
+            cut = match.start() + 1
+        if cut > 0:
+            return cut
+        cut = max(text.rfind(ws, 0, limit + 1) for ws in _WHITESPACE)
+        # Слово длиннее лимита режем жестко
+        return cut if cut > 0 else limit
@@ -0,0 +1,153 @@
+"""
+HTTP сессии клиента: пул соединений с keep-alive, раздельные таймауты,
+общая сессия для нескольких клиентов и прогрев соединений
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from lazy import lazy_import
+
+# Загружается при первом сетевом вызове, а не при импорте
+aiohttp = lazy_import("aiohttp")
+
+logger = logging.getLogger(__name__)
+
+# Общие сессии: (цикл событий, настройки пула) -> [сессия, число клиентов]
+_shared: Dict[Tuple, List[Any]] = {}
+
+
+def _seconds(value) -> Optional[float]:
+    """0 и None в конфигурации означают "без ограничения" """
+    return float(value) if value else None
+
+
+def client_timeout(config: Dict[str, Any], total: Optional[float] = None) -> "aiohttp.ClientTimeout":
+    """
+    Таймауты запросов из конфигурации
+
+    api_connection_timeout ограничивает только установку соединения
+    (sock_connect): ожидание свободного соединения в пуле при
+    connection_limit_per_host в него не входит, иначе запросы в очереди за
+    длинным синтезом падали бы по таймауту. api_read_timeout - пауза между
+    байтами ответа, поэтому длинный синтез не обрывается, пока сервер
+    продолжает отдавать аудио.
+
+    Args:
+        config: Словарь конфигурации клиента
+        total: Общий лимит вместо api_total_timeout (например, остаток крайнего срока)
+    """
+    configured_total = _seconds(config['api_total_timeout'])
+    if total is not None:
+        # Нулевой total в aiohttp означает "без ограничения", а не "уже истек"
+        total = max(total, 0.001)
+    if total is not None and configured_total is not None:
+        total = min(total, configured_total)
+    elif total is None:
+        total = configured_total
+    return aiohttp.ClientTimeout(
+        total=total,
+        sock_connect=_seconds(config['api_connection_timeout']),
+        sock_read=_seconds(config['api_read_timeout']),
+    )
+
+
+def _connector_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    keepalive = _seconds(config['keepalive_timeout'])
+    dns_ttl = config['dns_cache_ttl']
+    settings = {
+        "limit": int(config['connection_limit'] or 0),
+        "limit_per_host": int(config['connection_limit_per_host'] or 0),
+        "use_dns_cache": dns_ttl is None or dns_ttl > 0,
+        "ttl_dns_cache": dns_ttl if dns_ttl and dns_ttl > 0 else None,
+    }
+    if keepalive is None:
+        settings["force_close"] = True
+    else:
+        settings["keepalive_timeout"] = keepalive
+    return settings
+
+
+def _new_session(
+    config: Dict[str, Any], trace_configs: Optional[List["aiohttp.TraceConfig"]] = None
+) -> "aiohttp.ClientSession":
+    connector = aiohttp.TCPConnector(**_connector_settings(config))
+    return aiohttp.ClientSession(
+        connector=connector, timeout=client_timeout(config), trace_configs=trace_configs
+    )
+
+
+def _shared_key(config: Dict[str, Any], traced: bool) -> Tuple:
+    timeout = client_timeout(config)
+    return (
+        id(asyncio.get_running_loop()),
+        tuple(sorted(_connector_settings(config).items())),
+        (timeout.total, timeout.sock_connect, timeout.sock_read),
+        traced,
+    )
+
+
+def open_session(
+    config: Dict[str, Any], trace_configs: Optional[List["aiohttp.TraceConfig"]] = None
+) -> "aiohttp.ClientSession":
+    """
+    Создает сессию клиента или подключается к общей
+
+    С share_session=True клиенты одного цикла событий с одинаковыми
+    настройками пула используют одну сессию и одни keep-alive соединения.
+    Закрывать такую сессию нужно через close_session.
+
+    Args:
+        config: Словарь конфигурации клиента
+        trace_configs: Трассировка aiohttp; клиенты с трассировкой и без
+            нее получают разные общие сессии
+    """
+    if not config['share_session']:
+        return _new_session(config, trace_configs)
+
+    key = _shared_key(config, bool(trace_configs))
+    entry = _shared.get(key)
+    if entry is None or entry[0].closed:
+        entry = _shared[key] = [_new_session(config, trace_configs), 0]
+    entry[1] += 1
+    return entry[0]
+
+
+async def close_session(session: "aiohttp.ClientSession") -> None:
+    """Закрывает сессию; общая закрывается, когда ее отпустит последний клиент"""
+    for key, entry in list(_shared.items()):
+        if entry[0] is session:
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del _shared[key]
+            break
+    await session.close()
+
+
+async def prewarm(session: "aiohttp.ClientSession", urls: List[str], connections: int) -> int:
+    """
+    Открывает заранее до connections соединений с каждым сервером
+
+    Одновременные запросы /api/ready занимают отдельные соединения, которые
+    после ответа остаются в пуле keep-alive и достаются первым чанкам.
+
+    Returns:
+        Число успешных прогревочных запросов
+    """
+    if connections <= 0:
+        return 0
+
+    async def touch(url: str) -> bool:
+        try:
+            async with session.get(f"{url}/api/ready") as response:
+                await response.read()
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    results = await asyncio.gather(*(touch(url) for url in urls for _ in range(connections)))
+    warmed = sum(results)
+    logger.info(f"🔥 Прогрето соединений: {warmed}/{len(results)}")
+    return warmed
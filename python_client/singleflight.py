@@ -0,0 +1,213 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+На один ключ в работе не больше одного запроса к серверу, результат
+раздается всем ожидающим. Потоковые слушатели, подключившиеся позже,
+сначала получают уже пришедшие кадры, затем следуют за живым потоком,
+пока пришедшее помещается в окно воспроизведения.
+"""
+
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from scheduler import Ticket
+
+
+class _Flight:
+    """Запрос в работе и его слушатели"""
+
+    def __init__(self, ticket: Optional[Ticket] = None):
+        self.task: Optional[asyncio.Task] = None
+        self.listeners = 0
+        # Приоритет запроса - наивысший среди ожидающих
+        self.ticket = ticket
+        # Потоковый режим: кадры, еще нужные слушателям (frames[0] - кадр
+        # номер base), и номер следующего кадра каждого слушателя
+        self.frames: List[bytes] = []
+        self.base = 0
+        self.positions: Dict[object, int] = {}
+        # Подключиться можно, пока поток целиком с первого кадра в памяти
+        self.joinable = True
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.consumed = asyncio.Event()
+
+    @property
+    def received(self) -> int:
+        return self.base + len(self.frames)
+
+    def ahead(self) -> int:
+        """Сколько кадров еще не забрал самый быстрый слушатель"""
+        if not self.positions:
+            return 0
+        return self.received - max(self.positions.values())
+
+    def trim(self) -> None:
+        # После закрытия для новых слушателей держим только то, что не забрали текущие
+        if self.joinable:
+            return
+        low = min(self.positions.values(), default=self.received)
+        if low > self.base:
+            del self.frames[:low - self.base]
+            self.base = low
+
+    def notify(self) -> None:
+        # Будим текущих ожидающих и готовим событие для следующего кадра
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def notify_consumed(self) -> None:
+        self.consumed.set()
+        self.consumed = asyncio.Event()
+
+    def join(self, ticket: Optional[Ticket]) -> None:
+        self.listeners += 1
+        if ticket is not None and self.ticket is not None and ticket is not self.ticket:
+            self.ticket.escalate(ticket.priority, ticket.tenant)
+
+
+class SingleFlight:
+    """
+    Реестр запросов в работе по ключу
+
+    Запрос отменяется, только когда его покинули все слушатели: отмена
+    одного из них не обрывает результат для остальных. Запрос идет с
+    наивысшим приоритетом среди ожидающих: если к пакетному запросу
+    присоединился интерактивный, билет планировщика повышается.
+    """
+
+    def __init__(self, stream_window: int = 8):
+        """
+        Args:
+            stream_window: Сколько кадров поток может прочитать впереди самого
+                быстрого слушателя; пока поток с начала помещается в окно,
+                к нему можно подключиться
+        """
+        self.stream_window = max(1, stream_window)
+        self._calls: Dict[Hashable, _Flight] = {}
+        self._streams: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.joined = 0
+        # Наибольшее число кадров, которое держал один поток
+        self.peak_frames = 0
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    async def run(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]], ticket: Optional[Ticket] = None
+    ) -> Any:
+        """
+        Возвращает результат factory(), запущенной один раз на все
+        одновременные вызовы с тем же ключом
+
+        Args:
+            key: Ключ объединения
+            factory: Запуск запроса; должна использовать ticket первого вызова
+            ticket: Приоритет вызывающего - повышает приоритет общего запроса
+        """
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = self._calls[key] = _Flight(ticket)
+            flight.task = asyncio.ensure_future(factory())
+            flight.task.add_done_callback(lambda _: self._forget(self._calls, key, flight))
+            self.started += 1
+        else:
+            self.joined += 1
+
+        flight.join(ticket)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.listeners -= 1
+            if not flight.listeners and not flight.task.done():
+                flight.task.cancel()
+                self._forget(self._calls, key, flight)
+
+    async def stream(
+        self,
+        key: Hashable,
+        factory: Callable[[], AsyncIterator[bytes]],
+        ticket: Optional[Ticket] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Отдает кадры потока factory(), открытого один раз на всех слушателей
+
+        Каждый слушатель получает поток целиком с первого кадра. Источник
+        читается не дальше stream_window кадров впереди самого быстрого
+        слушателя, в памяти остаются только кадры, которые еще не забрал
+        самый медленный. Когда пришедшее перестает помещаться в окно, поток
+        закрывается для новых слушателей - они запустят свой запрос. Ошибка
+        источника пробрасывается всем слушателям.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Flight(ticket)
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory()))
+            flight.task.add_done_callback(lambda _: self._forget(self._streams, key, flight))
+            self.started += 1
+        else:
+            self.joined += 1
+
+        flight.join(ticket)
+        listener = object()
+        flight.positions[listener] = flight.base
+        try:
+            while True:
+                position = flight.positions[listener]
+                if position < flight.received:
+                    frame = flight.frames[position - flight.base]
+                    flight.positions[listener] = position + 1
+                    flight.trim()
+                    flight.notify_consumed()
+                    yield frame
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.listeners -= 1
+            del flight.positions[listener]
+            flight.trim()
+            flight.notify_consumed()
+            if not flight.listeners and not flight.task.done():
+                flight.task.cancel()
+                self._forget(self._streams, key, flight)
+
+    async def _pump(self, key: Hashable, flight: _Flight, source: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in source:
+                flight.frames.append(frame)
+                if flight.joinable and flight.received > self.stream_window:
+                    # Начало потока уже не помещается в окно - новые
+                    # слушатели получат его заново отдельным запросом
+                    flight.joinable = False
+                    self._forget(self._streams, key, flight)
+                    flight.trim()
+                self.peak_frames = max(self.peak_frames, len(flight.frames))
+                flight.notify()
+                # Читаем не дальше окна впереди самого быстрого слушателя.
+                # Ждать самого медленного нельзя: его потребитель может сам
+                # ждать конца другого чанка, который слушает через этот же
+                # поток (повтор фразы в одном тексте), - это взаимная блокировка
+                while flight.ahead() >= self.stream_window:
+                    await flight.consumed.wait()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.finished = True
+            flight.notify()
+            with contextlib.suppress(Exception):
+                await source.aclose()
+
+    @staticmethod
+    def _forget(registry: Dict[Hashable, _Flight], key: Hashable, flight: _Flight) -> None:
+        # Новые вызовы после завершения стартуют заново (или попадут в кэш)
+        if registry.get(key) is flight:
+            del registry[key]
@@ -0,0 +1,1047 @@
+#!/usr/bin/env python3
+"""
+🧪 Тесты пула серверов и клиента AllTalk на локальных заглушках
+Не требуют реального сервера: каждая заглушка обслуживает один запрос
+за раз (как GPU) с собственной задержкой
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+from adaptive import ChunkSizer
+from backends import BackendPool
+from batch import BatchRunner, read_journal, read_manifest
+from bench_segmenter import make_text, make_tokens
+from cache import AudioCache
+from cancellation import CancelHandle
+from client import SyncTTSClient, TTSConfig, TTSStreamingClient
+from errors import TTSOverloadError
+from fake_server import FakeAllTalkServer
+from normalize import normalize_text
+from segmenter import CLAUSE_END, SentenceSegmenter
+from tracing import CallbackSink, PrometheusSink
+from wav import wav_duration
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def make_wav(samples: int) -> bytes:
+    """Минимальный WAV: 16 бит, моно, 24 кГц"""
+    data = b"\x00\x00" * samples
+    header = (
+        b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, 24000, 48000, 2, 16)
+        + b"data" + struct.pack("<I", len(data))
+    )
+    return header + data
+
+
+class StubServer:
+    """Заглушка AllTalk: /api/ready и /api/tts-generate-streaming"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.ready = True
+        self.requests = 0
+        self.stops = 0
+        # Тексты запросов синтеза по порядку
+        self.texts = []
+        # Адреса клиентов - по ним видно, сколько TCP соединений открыто
+        self.peers = set()
+        self.url = ""
+        # Ответы следующих запросов: коды ошибок и задержки до ответа, по порядку
+        self.statuses = []
+        self.stalls = []
+        self._gpu = asyncio.Semaphore(1)
+        self._runner = None
+
+    async def start(self) -> "StubServer":
+        app = web.Application()
+        app.router.add_get("/api/ready", self._ready)
+        app.router.add_get("/api/tts-generate-streaming", self._tts)
+        app.router.add_put("/api/stop-generation", self._stop)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+    async def _ready(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        return web.Response(text="Ready" if self.ready else "Unloaded")
+
+    async def _stop(self, request):
+        self.stops += 1
+        return web.json_response({"status": "success"})
+
+    async def _tts(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.texts.append(request.query.get("text", ""))
+        if self.stalls:
+            # Зависший запрос не занимает GPU, чтобы не задерживать следующие
+            self.requests += 1
+            await asyncio.sleep(self.stalls.pop(0))
+            return web.Response(body=make_wav(100), content_type="audio/wav")
+        if self.statuses:
+            self.requests += 1
+            return web.Response(status=self.statuses.pop(0), text="Server busy")
+        async with self._gpu:
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            return web.Response(body=make_wav(len(request.query["text"]) * 100), content_type="audio/wav")
+
+
+def write_config(urls, **overrides) -> str:
+    """Создает временный конфиг клиента для заглушек"""
+    config = {
+        "api_alltalk_protocol": "http://",
+        "api_alltalk_ip_port": urls[0].split("://", 1)[1],
+        "api_alltalk_backends": urls,
+        "api_connection_timeout": 10,
+        "cache_enabled": False,
+        "health_check_interval": 0.1,
+    }
+    config.update(overrides)
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return path
+
+
+async def test_least_outstanding_routing():
+    """Новый запрос уходит на сервер с наименьшим числом активных запросов"""
+    pool = BackendPool(["http://a", "http://b", "http://c"])
+    first = [pool.acquire() for _ in range(3)]
+    spread = len({backend.url for backend in first}) == 3
+
+    # Освобождаем только "b" - следующий запрос должен уйти туда
+    busy_b = next(backend for backend in first if backend.url == "http://b")
+    pool.release(busy_b, elapsed=0.1)
+    routed_to_b = pool.acquire().url == "http://b"
+
+    logger.info(f"📊 Разнесено по серверам: {spread}, освободившийся выбран: {routed_to_b}")
+    return spread and routed_to_b
+
+
+async def test_ejection_and_recovery():
+    """Сервер исключается, когда /api/ready не готов, и возвращается после восстановления"""
+    servers = [await StubServer(0.01).start() for _ in range(2)]
+    config_file = write_config([server.url for server in servers])
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            servers[1].ready = False
+            await client.pool.check_all()
+            ejected = [backend.healthy for backend in client.pool.backends] == [True, False]
+
+            before = servers[1].requests
+            for i in range(4):
+                await client.stream_tts_chunk(f"Фраза {i}")
+            avoided = servers[1].requests == before
+
+            servers[1].ready = True
+            await asyncio.sleep(0.3)  # плановый опрос
+            recovered = all(backend.healthy for backend in client.pool.backends)
+
+        logger.info(f"📊 Исключен: {ejected}, обойден: {avoided}, восстановлен: {recovered}")
+        return ejected and avoided and recovered
+    finally:
+        os.remove(config_file)
+        for server in servers:
+            await server.stop()
+
+
+async def run_load(urls, chunks: int) -> float:
+    """Синтезирует текст из chunks предложений и возвращает пропускную способность, чанк/с"""
+    config_file = write_config(urls, max_concurrent_chunks=8)
+    text = " ".join(f"Предложение номер {i}." for i in range(chunks))
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            start = time.perf_counter()
+            received = 0
+            async for _ in client.generate_tts_from_text(text, max_chunk_size=25):
+                received += 1
+            elapsed = time.perf_counter() - start
+        return received / elapsed if received == chunks else 0.0
+    finally:
+        os.remove(config_file)
+
+
+async def test_throughput_scaling():
+    """Пропускная способность растет с числом серверов"""
+    servers = [await StubServer(latency).start() for latency in (0.05, 0.07, 0.09)]
+    try:
+        results = {}
+        for count in (1, 2, 3):
+            results[count] = await run_load([server.url for server in servers[:count]], 24)
+            logger.info(f"📊 Серверов: {count} - {results[count]:.1f} чанк/с")
+        return results[2] > results[1] * 1.5 and results[3] > results[2] * 1.2
+    finally:
+        for server in servers:
+            await server.stop()
+
+
+async def test_retries_and_deadline():
+    """5xx и 429 повторяются, 4xx - нет, крайний срок обрывает повторы"""
+    server = await StubServer(0.01).start()
+    config_file = write_config([server.url], max_retries=2, retry_delay=0.01, coalesce_requests=False)
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            server.statuses = [503, 502]
+            recovered = await client.synthesize_chunk("Повтор после 5xx")
+            server.statuses = [429]
+            throttled = await client.synthesize_chunk("Повтор после 429")
+            server.statuses = [503, 503, 503]
+            exhausted = await client.synthesize_chunk("Все попытки неудачны")
+            server.statuses = [404]
+            before = server.requests
+            missing = await client.synthesize_chunk("Не повторяется")
+            not_retried = server.requests - before == 1
+
+            # Потоковый путь повторяет до первого кадра
+            server.statuses = [500]
+            frames = [frame async for frame in client.stream_tts_chunk_iter("Потоковый повтор")]
+
+            client.config.config['chunk_deadline'] = 0.2
+            server.stalls = [2.0]
+            started = time.perf_counter()
+            late = await client.synthesize_chunk("Зависший запрос")
+            deadline_elapsed = time.perf_counter() - started
+
+        logger.info(
+            f"📊 5xx: {recovered}, 429: {throttled}, исчерпаны: {exhausted}, 404: {missing}, "
+            f"крайний срок: {late.error} за {deadline_elapsed:.2f}с"
+        )
+        return (
+            recovered.ok and recovered.attempts == 3
+            and throttled.ok and throttled.attempts == 2
+            and not exhausted.ok and exhausted.retryable and exhausted.attempts == 3 and exhausted.status == 503
+            and not missing.ok and not missing.retryable and missing.attempts == 1 and not_retried
+            and frames and frames[0].startswith(b"RIFF")
+            and not late.ok and deadline_elapsed < 0.5
+        )
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_hedged_requests():
+    """Зависший запрос дублируется на другой сервер, а с одним сервером хеджирования нет"""
+    servers = [await StubServer(0.01).start() for _ in range(2)]
+    overrides = dict(hedge_requests=True, hedge_min_samples=5, max_retries=0, coalesce_requests=False)
+    pair_config = write_config([server.url for server in servers], **overrides)
+    single_config = write_config([servers[0].url], **overrides)
+    try:
+        async with TTSStreamingClient(pair_config) as client:
+            for i in range(5):
+                await client.synthesize_chunk(f"Замер задержки {i}")
+            # Общий список: зависает только основной запрос, на каком бы сервере он ни оказался
+            stall = [2.0]
+            for server in servers:
+                server.stalls = stall
+            started = time.perf_counter()
+            hedged = await client.synthesize_chunk("Хеджированный запрос")
+            hedged_elapsed = time.perf_counter() - started
+            await asyncio.sleep(0.05)
+            # Проигравший дубликат отменяется без /api/stop-generation
+            hedge_stops = sum(server.stops for server in servers)
+
+        async with TTSStreamingClient(single_config) as client:
+            for i in range(5):
+                await client.synthesize_chunk(f"Один сервер {i}")
+            before = servers[0].requests
+            servers[0].stalls = [0.3]
+            lone = await client.synthesize_chunk("Без дубликата")
+            single_requests = servers[0].requests - before
+
+        logger.info(
+            f"📊 Хедж: {hedged_elapsed:.2f}с, остановок: {hedge_stops}, запросов на одном сервере: {single_requests}"
+        )
+        return hedged.ok and hedged_elapsed < 1.0 and hedge_stops == 0 and lone.ok and single_requests == 1
+    finally:
+        os.remove(pair_config)
+        os.remove(single_config)
+        for server in servers:
+            await server.stop()
+
+
+async def test_prewarm_and_shared_session():
+    """Прогретые соединения переиспользуются, общая сессия живет до последнего клиента"""
+    server = await StubServer(0.01).start()
+    config_file = write_config([server.url], prewarm_connections=3, share_session=True)
+    try:
+        async with TTSStreamingClient(config_file) as first:
+            warmed = len(server.peers)
+            async with TTSStreamingClient(config_file) as second:
+                shared = first.session is second.session
+                await asyncio.gather(*(second.stream_tts_chunk(f"Фраза {i}") for i in range(3)))
+            still_open = not first.session.closed
+            await first.stream_tts_chunk("Еще одна фраза")
+        # Второй клиент и все чанки идут по трем уже открытым соединениям
+        reused = len(server.peers) == 3
+        logger.info(f"📊 Прогрето: {warmed}, общая сессия: {shared}, соединений всего: {len(server.peers)}")
+        return warmed == 3 and shared and still_open and reused
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_pool_wait_not_connect_timeout():
+    """Ожидание свободного соединения в пуле не считается таймаутом соединения"""
+    server = await StubServer(0.3).start()
+    config_file = write_config(
+        [server.url], connection_limit_per_host=1, api_connection_timeout=0.1,
+        max_retries=0, coalesce_requests=False,
+    )
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            results = await asyncio.gather(*(client.synthesize_chunk(f"Очередь {i}") for i in range(2)))
+
+            # Без chunk_deadline таймауты сессии все равно действуют
+            client.config.config['api_read_timeout'] = 0.1
+            server.stalls = [1.0]
+            started = time.perf_counter()
+            stalled = await client.synthesize_chunk("Молчащий сервер")
+            stalled_elapsed = time.perf_counter() - started
+        logger.info(f"📊 Запросы за одним соединением: {results}, молчащий сервер: {stalled.error} за {stalled_elapsed:.2f}с")
+        return (
+            all(result.ok for result in results) and server.requests == 3
+            and not stalled.ok and stalled_elapsed < 0.5
+        )
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_sync_client_threads():
+    """SyncTTSClient обслуживает много потоков одним фоновым циклом и одной сессией"""
+    server = await StubServer(0.01).start()
+    config_file = write_config([server.url])
+
+    def work(client: SyncTTSClient, i: int):
+        audio = client.synthesize(f"Первая фраза {i}. Вторая фраза {i}.", max_chunk_size=20)
+        frames = list(client.stream(f"Поток {i}. Еще кусок {i}.", max_chunk_size=15))
+        return audio, frames, client.client.session
+
+    try:
+        # Заглушка живет в этом цикле, поэтому блокирующие вызовы уводим в пул потоков
+        with SyncTTSClient(config_file) as client:
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                results = await asyncio.gather(*(
+                    asyncio.get_running_loop().run_in_executor(executor, work, client, i)
+                    for i in range(16)
+                ))
+            loops = client._thread is not None
+        whole = all(audio.startswith(b"RIFF") and wav_duration(audio) > 0 for audio, _, _ in results)
+        streamed = all(len(frames) == 2 for _, frames, _ in results)
+        one_session = len({id(session) for _, _, session in results}) == 1
+        logger.info(f"📊 Целый WAV: {whole}, поток по чанкам: {streamed}, одна сессия: {one_session}")
+        return whole and streamed and one_session and loops
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_request_coalescing():
+    """Одинаковые одновременные запросы уходят на сервер один раз"""
+    server = await StubServer(0.1).start()
+    config_file = write_config([server.url])
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            whole = await asyncio.gather(*(client.stream_tts_chunk("Общая фраза") for _ in range(50)))
+            after_whole = server.requests
+
+            async def listen(delay: float) -> bytes:
+                await asyncio.sleep(delay)
+                return b"".join([frame async for frame in client.stream_tts_chunk_iter("Общая фраза", read_size=512)])
+
+            # Часть слушателей подключается, когда поток уже идет
+            streamed = await asyncio.gather(*(listen(0.02 * (i % 5)) for i in range(50)))
+            after_stream = server.requests
+
+            # Отмена одного слушателя не обрывает запрос для остальных
+            lonely = asyncio.ensure_future(client.stream_tts_chunk("Другая фраза"))
+            shared = asyncio.ensure_future(client.stream_tts_chunk("Другая фраза"))
+            await asyncio.sleep(0.02)
+            lonely.cancel()
+            survived = bool(await shared)
+
+        fan_out = len(set(whole)) == 1 and whole[0] and len(set(streamed)) == 1 and streamed[0] == whole[0]
+        logger.info(f"📊 Запросов к серверу: {after_whole} целиком, {after_stream - after_whole} потоком на 100 вызовов")
+        return fan_out and after_whole == 1 and after_stream == 2 and survived
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_coalesced_stream_bounds():
+    """Общий поток держит не больше окна кадров, а общий запрос идет с наивысшим приоритетом ожидающих"""
+    server = await FakeAllTalkServer(per_char_latency=0.0001, frame_interval=0.001, jitter=0).start()
+    config_file = write_config([server.url], stream_buffer_frames=4)
+    text = "Длинный общий чанк для медленного слушателя. " * 8
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            frames = 0
+            late = None
+            slow = bytearray()
+            async for frame in client.stream_tts_chunk_iter(text, read_size=4096):
+                slow += frame
+                frames += 1
+                if frames == 10:
+                    # Начало потока уже вытеснено - опоздавший запускает свой запрос
+                    late = asyncio.ensure_future(client.stream_tts_chunk(text))
+                await asyncio.sleep(0.002)
+            late_audio = await late
+            peak = client.flights.peak_frames
+
+            # Одна фраза трижды в тексте: чанки ждут друг друга в общем потоке без блокировки
+            async def repeated():
+                return [frame async for frame in client.generate_tts_from_text(
+                    "Повторяющаяся фраза для синтеза. " * 3, max_chunk_size=40, incremental=True
+                )]
+            repeated_frames = await asyncio.wait_for(repeated(), 10)
+        bounded = (
+            frames > 50 and peak <= 4 and late_audio == bytes(slow) and server.requests == 3
+            and sum(frame.startswith(b"RIFF") for frame in repeated_frames) == 3
+        )
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+    stub = await StubServer(0.05).start()
+    config_file = write_config([stub.url], max_inflight_requests=1)
+    finished = []
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            async def job(name: str, text: str, priority: str):
+                await client.stream_tts_chunk(text, priority=priority)
+                finished.append(name)
+
+            jobs = [asyncio.ensure_future(job("blocker", "Занимает сервер", "normal"))]
+            await asyncio.sleep(0.01)
+            jobs.append(asyncio.ensure_future(job("batch", "Общий запрос", "batch")))
+            jobs.append(asyncio.ensure_future(job("normal", "Обычный запрос", "normal")))
+            await asyncio.sleep(0)
+            # Интерактивный вызов присоединяется к пакетному и поднимает его над normal
+            jobs.append(asyncio.ensure_future(job("interactive", "Общий запрос", "interactive")))
+            await asyncio.gather(*jobs)
+        escalated = finished.index("interactive") < finished.index("normal") and stub.requests == 3
+    finally:
+        os.remove(config_file)
+        await stub.stop()
+
+    logger.info(f"📊 Кадров: {frames}, пик в общем потоке: {peak}, порядок: {finished}")
+    return bounded and escalated
+
+
+async def test_segmenter_limits():
+    """Нарезка потока токенов не теряет текст, держит лимит и режет в порядке приоритетов chunk_text"""
+    splitter = TTSStreamingClient("")
+    for seed in range(20):
+        text = make_text(3000, seed)
+        for limit in (12, 40, 100):
+            segmenter = SentenceSegmenter(limit)
+            chunks = []
+            for token in make_tokens(text, seed + 100):
+                chunks.extend(segmenter.feed(token))
+            chunks.extend(segmenter.flush())
+
+            if "".join("".join(chunks).split()) != "".join(text.split()):
+                logger.error(f"❌ Потерян текст: seed={seed}, limit={limit}")
+                return False
+            if any(not chunk or len(chunk) > limit for chunk in chunks):
+                logger.error(f"❌ Чанк вне лимита {limit}: {[c for c in chunks if not c or len(c) > limit]}")
+                return False
+            # Те же слова, что у chunk_text (он отбрасывает знаки на границах, а
+            # клаузы длинного предложения ставит перед накопленным чанком)
+            words = sorted(re.findall(r"\w+", " ".join(chunks)))
+            if words != sorted(re.findall(r"\w+", " ".join(splitter.chunk_text(text, limit)))):
+                logger.error(f"❌ Слова расходятся с chunk_text: seed={seed}, limit={limit}")
+                return False
+            # Разрез посреди предложения по словам - только если в пределах лимита не было [;,]
+            for chunk in chunks[:-1]:
+                if chunk[-1] not in ".!?;," and CLAUSE_END.search(chunk):
+                    logger.error(f"❌ Разрез по словам мимо [;,]: {chunk!r}")
+                    return False
+
+            # Поток токенов режется так же, как весь текст за раз
+            whole = SentenceSegmenter(limit)
+            if whole.feed(text) + whole.flush() != chunks:
+                logger.error(f"❌ Нарезка зависит от деления на токены: seed={seed}, limit={limit}")
+                return False
+    logger.info("📊 20 текстов x 3 лимита: текст сохранен, лимит соблюден")
+    return True
+
+
+async def test_audio_cache_disk():
+    """Дисковый уровень переживает перезапуск, вытесняет старые записи и соблюдает TTL"""
+    directory = tempfile.mkdtemp()
+    audio = [make_wav(1000 + i) for i in range(3)]
+    keys = [AudioCache.make_key(f"Фраза {i}", "Arnold.wav", "ru") for i in range(3)]
+
+    cache = AudioCache(directory, memory_limit=len(audio[0]) + 10, disk_limit=len(audio[0]) * 2 + 10, ttl=0)
+    for key, data in zip(keys, audio):
+        cache.put(key, data)
+        time.sleep(0.01)  # разные mtime - порядок вытеснения после перезапуска
+
+    # Новый экземпляр строит индекс из каталога; первая запись вытеснена
+    restarted = AudioCache(directory, memory_limit=len(audio[0]) + 10, disk_limit=len(audio[0]) * 2 + 10, ttl=0)
+    evicted = restarted.get(keys[0]) is None
+    from_disk = restarted.get(keys[2]) == audio[2] and restarted.stats["disk_hits"] == 1
+    from_memory = restarted.get_memory(keys[2]) == audio[2] and restarted.stats["memory_hits"] == 1
+
+    # Просроченный файл удаляется при чтении
+    expiring = AudioCache(directory, ttl=0.05)
+    await asyncio.sleep(0.1)
+    expired = expiring.get(keys[1]) is None and not os.path.exists(expiring._path(keys[1]))
+
+    # Клиент читает диск в отдельном потоке, а не в цикле событий
+    config_file = write_config(["http://127.0.0.1:1"], cache_enabled=True, cache_dir=directory)
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            client.cache.put(keys[0], audio[0])
+            client.cache._memory.clear()
+            loop_thread = threading.get_ident()
+            readers = []
+            original = client.cache.get
+
+            def get(key):
+                readers.append(threading.get_ident())
+                return original(key)
+
+            client.cache.get = get
+            offloaded = await client._cache_lookup(keys[0]) == audio[0] and readers and readers[0] != loop_thread
+    finally:
+        os.remove(config_file)
+
+    logger.info(f"📊 Вытеснена: {evicted}, с диска: {from_disk}, из памяти: {from_memory}, TTL: {expired}")
+    return evicted and from_disk and from_memory and expired and bool(offloaded)
+
+
+async def test_adaptive_chunk_sizes():
+    """Первый чанк короткий, следующие растут, пока синтез опережает воспроизведение"""
+    sizer = ChunkSizer(first_chunk_size=40, min_chunk_size=20, max_chunk_size=400)
+    # Быстрый сервер: 0.2с на запрос + 5мс на символ при 60мс аудио на символ
+    for chars in (40, 80, 150, 300):
+        sizer.record("fast.wav", "ru", chars, 0.2 + 0.005 * chars, 0.06 * chars)
+    sizes = [sizer.next_size("fast.wav", "ru")]
+    while len(sizes) < 5:
+        sizes.append(sizer.next_size("fast.wav", "ru", sizes[-1]))
+    growing = sizes[0] == 40 and sizes == sorted(sizes) and sizes[-1] == 400
+
+    # Сервер медленнее реального времени - сразу крупные чанки
+    sizer.record("slow.wav", "ru", 100, 8.0, 6.0)
+    slow = sizer.next_size("slow.wav", "ru", 40) == 400
+
+    # Без замеров - осторожный геометрический рост
+    unknown = sizer.next_size("new.wav", "en", 40) == 80
+
+    logger.info(f"📊 Размеры чанков: {sizes}, RTF быстрого сервера {sizer.real_time_factor('fast.wav', 'ru'):.2f}")
+    return growing and slow and unknown
+
+
+async def run_mixed_load(url: str, **overrides) -> float:
+    """Пакетная озвучка плюс живые реплики; возвращает худшую задержку реплики"""
+    config_file = write_config([url], coalesce_requests=False, **overrides)
+    text = " ".join(f"Пакетное предложение номер {i}." for i in range(30))
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            async def narrate():
+                async for _ in client.generate_tts_from_text(
+                    text, max_chunk_size=30, max_concurrency=8, priority="batch", tenant="books"
+                ):
+                    pass
+
+            async def replies():
+                latencies = []
+                for i in range(5):
+                    await asyncio.sleep(0.1)
+                    started = time.perf_counter()
+                    await client.stream_tts_chunk(f"Живой ответ {i}", priority="interactive", tenant="call")
+                    latencies.append(time.perf_counter() - started)
+                return latencies
+
+            _, latencies = await asyncio.gather(narrate(), replies())
+        return max(latencies)
+    finally:
+        os.remove(config_file)
+
+
+async def test_priority_scheduler():
+    """Живые реплики не ждут пакетную озвучку, арендаторы обслуживаются по кругу, очередь ограничена"""
+    server = await StubServer(0.03).start()
+    try:
+        unscheduled = await run_mixed_load(server.url)
+        scheduled = await run_mixed_load(server.url, max_inflight_requests=1)
+        logger.info(f"📊 Худшая задержка реплики: {unscheduled:.2f}с без планировщика, {scheduled:.2f}с с ним")
+        prioritized = scheduled < unscheduled / 2
+
+        # Честная очередь: у маленького заказа два запроса, у большого - десять
+        config_file = write_config([server.url], coalesce_requests=False, max_inflight_requests=1, max_queue_depth=11)
+        try:
+            async with TTSStreamingClient(config_file) as client:
+                finished = []
+
+                async def job(tenant: str, i: int):
+                    await client.stream_tts_chunk(f"{tenant} {i}", priority="batch", tenant=tenant)
+                    finished.append(tenant)
+
+                jobs = [asyncio.ensure_future(job("big", i)) for i in range(10)]
+                await asyncio.sleep(0)
+                jobs += [asyncio.ensure_future(job("small", i)) for i in range(2)]
+                await asyncio.sleep(0)
+                try:
+                    await client.stream_tts_chunk("Лишний запрос", priority="batch")
+                    rejected = False
+                except TTSOverloadError:
+                    rejected = True
+                await asyncio.gather(*jobs)
+            fair = finished.index("small") <= 2 and "small" not in finished[5:]
+        finally:
+            os.remove(config_file)
+        logger.info(f"📊 Порядок обслуживания: {finished}, отказ при переполнении: {rejected}")
+        return prioritized and fair and rejected
+    finally:
+        await server.stop()
+
+
+async def test_barge_in():
+    """cancel() обрывает поток, снимает чанки из очереди и останавливает генерацию на сервере"""
+    server = await FakeAllTalkServer(per_char_latency=0.02, frame_interval=0.02).start()
+    config_file = write_config([server.url])
+
+    async def tokens():
+        for i in range(40):
+            yield f"Длинное предложение номер {i} для перебивания. "
+            await asyncio.sleep(0.01)
+
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            handle = CancelHandle()
+            frames = 0
+            async for _ in client.stream_tts_from_iterator(tokens(), max_chunk_size=60, incremental=True, cancel=handle):
+                frames += 1
+                if frames == 3:
+                    cancelled_at = time.perf_counter()
+                    handle.cancel()
+            ended = time.perf_counter() - cancelled_at
+
+            # Сервер освобождается за миллисекунды, а не по окончании синтеза
+            for _ in range(100):
+                if not server._active:
+                    break
+                await asyncio.sleep(0.005)
+            freed = time.perf_counter() - cancelled_at
+            requests = server.requests
+
+        logger.info(
+            f"📊 Поток закончился через {ended * 1000:.1f}мс, сервер свободен через {freed * 1000:.1f}мс, "
+            f"stop-generation: {server.stopped}, запросов: {requests}"
+        )
+        return frames == 3 and ended < 0.05 and freed < 0.1 and server.stopped >= 1 and requests <= 4
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_stop_spares_other_clients():
+    """Отмена в одном клиенте не останавливает генерацию, которую ждет другой клиент того же процесса"""
+    server = await FakeAllTalkServer(per_char_latency=0.005, frame_interval=0.01, jitter=0).start()
+    config_file = write_config([server.url], coalesce_requests=False)
+    try:
+        async with TTSStreamingClient(config_file) as listener, TTSStreamingClient(config_file) as caller:
+            kept = asyncio.ensure_future(listener.synthesize_chunk("Этот ответ ждет другой клиент до конца."))
+            await asyncio.sleep(0.02)
+            dropped = asyncio.ensure_future(caller.synthesize_chunk("Этот запрос перебьют."))
+            await asyncio.sleep(0.05)
+            dropped.cancel()
+            result = await kept
+            await asyncio.sleep(0.05)
+            spared = server.stopped
+
+            # Когда запросов к серверу больше нет ни у кого, отмена останавливает генерацию
+            alone = asyncio.ensure_future(caller.synthesize_chunk("Единственный запрос к серверу."))
+            await asyncio.sleep(0.05)
+            alone.cancel()
+            await asyncio.sleep(0.05)
+            stopped = server.stopped
+        logger.info(f"📊 Ответ другого клиента: {result}, остановок: {spared} -> {stopped}")
+        return result.ok and spared == 0 and stopped == 1
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_chunk_tracing():
+    """Спаны чанков содержат фазы запроса, а PrometheusSink отдает их в текстовом формате"""
+    server = await FakeAllTalkServer(base_latency=0.05, per_char_latency=0.001, frame_interval=0.01).start()
+    config_file = write_config([server.url], cache_enabled=True, cache_dir="")
+    spans = []
+    prometheus = PrometheusSink()
+
+    def collect(span):
+        spans.append(span)
+        prometheus.record(span)
+
+    try:
+        async with TTSStreamingClient(config_file, trace_sink=CallbackSink(collect)) as client:
+            text = "Проверка трассировки чанков."
+            result = await client.synthesize_chunk(text)
+            frames = [frame async for frame in client.stream_tts_chunk_iter("Потоковый чанк для трассировки.")]
+            await client.synthesize_chunk(text)
+
+        fetched, streamed, cached = spans
+        exposition = prometheus.render()
+        logger.info(f"📊 Спаны: {spans}")
+        return (
+            result.ok and frames
+            and fetched.bytes == len(result.audio) and fetched.chars == len(text)
+            and fetched.ttfb >= 0.05 and fetched.connect > 0
+            and fetched.total >= fetched.queue_wait + fetched.ttfb + fetched.transfer
+            and streamed.streaming and streamed.bytes == sum(map(len, frames)) and streamed.transfer > 0
+            # Второе соединение не нужно - keep-alive
+            and streamed.connect == 0
+            and cached.cached and cached.bytes == len(result.audio)
+            and 'outcome="cached"} 1' in exposition
+            and f'tts_chunk_bytes_total{{backend="{server.url}",priority="normal"}} {fetched.bytes + streamed.bytes}' in exposition
+            and 'phase="ttfb",le="+Inf"} 2' in exposition
+        )
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_iterator_stall_keeps_words():
+    """Пауза в потоке токенов не режет слово, разбитое на несколько токенов LLM"""
+    server = await StubServer(latency=0.01).start()
+    config_file = write_config([server.url], adaptive_chunking=False)
+
+    async def tokens():
+        for token in ["Привет, как по", "жив", "аете сегодня"]:
+            yield token
+            await asyncio.sleep(0.3)
+
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            async for _ in client.stream_tts_from_iterator(tokens(), chunk_timeout=0.1):
+                pass
+        logger.info(f"📊 Запросы: {server.texts}")
+        # Последнее слово ждет конца потока - оно тоже могло продолжиться
+        return server.texts == ["Привет, как", "поживаете", "сегодня"]
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_batch_resume():
+    """Пакетный запуск пишет WAV файлы и журнал, повторный запуск продолжает с места остановки"""
+    server = await FakeAllTalkServer(per_char_latency=0.001, frame_interval=0.005).start()
+    config_file = write_config([server.url])
+    output_dir = tempfile.mkdtemp()
+    manifest = os.path.join(output_dir, "manifest.jsonl")
+    with open(manifest, "w", encoding="utf-8") as f:
+        for i in range(8):
+            text = f"Документ номер {i}. " + "Еще одно предложение для синтеза. " * (i % 3 + 1)
+            f.write(json.dumps({"id": f"doc/{i}", "text": text}, ensure_ascii=False) + "\n")
+
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            # Первый запуск "упал" после трех документов
+            first = await BatchRunner(client, output_dir, concurrency=2).run(list(read_manifest(manifest))[:3])
+            second = await BatchRunner(client, output_dir, concurrency=3, max_chunk_size=40).run(read_manifest(manifest))
+
+        files = sorted(name for name in os.listdir(output_dir) if name.endswith(".wav"))
+        durations = []
+        for name in files:
+            with open(os.path.join(output_dir, name), "rb") as f:
+                durations.append(wav_duration(f.read()))
+        logger.info(f"📊 Первый запуск: {first}")
+        logger.info(f"📊 Продолжение: {second}")
+        return (
+            first["items"] == 3 and second["skipped"] == 3 and second["items"] == 5
+            and second["failed"] == 0 and len(files) == 8 and files[0] == "doc_0.wav"
+            and all(d > 0 for d in durations)
+            and second["audio_seconds_per_second"] > 0
+            and len(read_journal(os.path.join(output_dir, "journal.jsonl"))) == 8
+            and not any(name.endswith(".part") for name in os.listdir(output_dir))
+        )
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_batch_bad_documents():
+    """Пустые документы не отмечаются готовыми, ошибка файловой системы не убивает воркер"""
+    server = await FakeAllTalkServer(per_char_latency=0.001, frame_interval=0.005).start()
+    config_file = write_config([server.url])
+    output_dir = tempfile.mkdtemp()
+    # На месте итогового файла каталог - os.replace упадет
+    os.makedirs(os.path.join(output_dir, "blocked.wav"))
+    items = [
+        {"id": "empty", "text": ""},
+        {"id": "emoji", "text": "🎉 🎉"},
+        {"id": "blocked", "text": "Этот документ некуда сохранить."},
+        {"id": "ok", "text": "Обычный документ для синтеза."},
+    ]
+
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            # Один воркер: если он погибнет, run() зависнет на очереди
+            stats = await asyncio.wait_for(BatchRunner(client, output_dir, concurrency=1).run(items), timeout=10)
+
+        journal_path = os.path.join(output_dir, "journal.jsonl")
+        with open(journal_path, encoding="utf-8") as f:
+            statuses = {entry["id"]: entry["status"] for entry in map(json.loads, f)}
+        logger.info(f"📊 Статусы: {statuses}, статистика: {stats}")
+        return (
+            statuses == {"empty": "skipped", "emoji": "skipped", "blocked": "failed", "ok": "done"}
+            and stats["items"] == 1 and stats["failed"] == 1 and stats["skipped"] == 2
+            and read_journal(journal_path) == {"ok"}
+            and not os.path.exists(os.path.join(output_dir, "empty.wav"))
+            and not any(name.endswith(".part") for name in os.listdir(output_dir))
+        )
+    except asyncio.TimeoutError:
+        logger.error("❌ Пакетный запуск завис")
+        return False
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_text_normalization():
+    """Разметка, числа и сокращения нормализуются, варианты одной фразы делят ключ кэша"""
+    cases = [
+        ("**Итого:**  21 руб.,   т.е. 3,5% 🎉", "ru", "Итого: двадцать один рубль, то есть три запятая пять процента"),
+        ("В 2001 году - 101 тыс. человек!!!", "ru", "В две тысячи один году - сто одна тысяча человек!"),
+        ("## Total: $1,250 & 1 kg, e.g. `x`", "en", "Total: one thousand two hundred fifty dollars and one kilogram, for example x"),
+        ("See [docs](https://example.com) - mp3, COVID-19", "en", "See docs - mp3, COVID-nineteen"),
+        # "No." - номер только перед числом, точка конца предложения сохраняется
+        ("No. That is wrong.", "en", "No. That is wrong."),
+        ("Item No. 5 and No.6", "en", "Item number five and number six"),
+        ("Длина 5 см.", "ru", "Длина пять сантиметров."),
+        # Телефон - не группы разрядов
+        ("Звоните 8 800 555 35 35", "ru", "Звоните восемь восемьсот пятьсот пятьдесят пять тридцать пять тридцать пять"),
+        ("Тираж 1 000 000 экз", "ru", "Тираж один миллион экз"),
+        # Точка сокращения в конце предложения сохраняется
+        ("Итого 100 руб. Спасибо.", "ru", "Итого сто рублей. Спасибо."),
+        ("Ждите 5 мин. Потом звоните.", "ru", "Ждите пять минут. Потом звоните."),
+        ("Овощи, фрукты и т.д. Потом мясо.", "ru", "Овощи, фрукты и так далее. Потом мясо."),
+        ("Talk to the Dr. He knows.", "en", "Talk to the Doctor. He knows."),
+        ("Ask Dr. Smith, etc.", "en", "Ask Doctor Smith, et cetera."),
+        # Номер пункта снимается только в списке из нескольких пунктов
+        ("42. Ответ", "ru", "сорок два. Ответ"),
+        ("Шаги:\n1) купить\n2) сварить", "ru", "Шаги: купить сварить"),
+        # Подчеркивания в идентификаторах и знаки операций - не разметка
+        ("snake_case_name and 2*3", "en", "snake case name and two times three"),
+        ("if a < b and b > c", "en", "if a less than b and b greater than c"),
+        ("Это _курсив_, а сноска* - нет", "ru", "Это курсив, а сноска - нет"),
+    ]
+    for text, language, expected in cases:
+        actual = normalize_text(text, language)
+        if actual != expected:
+            logger.error(f"❌ {text!r} -> {actual!r}, ожидалось {expected!r}")
+            return False
+
+    server = await FakeAllTalkServer(per_char_latency=0.001).start()
+    config_file = write_config([server.url], cache_enabled=True, cache_dir="")
+    try:
+        async with TTSStreamingClient(config_file) as client:
+            first = await client.synthesize_chunk("Заказ   №7 стоит 1500 руб.")
+            second = await client.synthesize_chunk("**Заказ** № 7 стоит 1 500 руб.")
+            stats = client.normalizer.stats()
+        logger.info(f"📊 Нормализация: {stats}, запросов к серверу: {server.requests}")
+        return first.ok and second.cached and server.requests == 1 and stats["calls"] == 2
+    finally:
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_startup_warmup():
+    """Прогрев ждет загрузки модели, кэширует голоса и синтезирует пробную фразу каждым голосом"""
+    server = await FakeAllTalkServer(per_char_latency=0.001).start()
+    server.ready = False
+    config_file = write_config(
+        [server.url], warmup_on_enter=True, warmup_ready_timeout=5,
+        warmup_voices=["Arnold.wav", "female_01.wav", "missing.wav"],
+    )
+
+    async def load_model():
+        await asyncio.sleep(0.4)
+        server.ready = True
+
+    loader = asyncio.ensure_future(load_model())
+    try:
+        started = time.perf_counter()
+        async with TTSStreamingClient(config_file) as client:
+            entered = time.perf_counter() - started
+            primed = server.requests
+            unknown = await client.synthesize_chunk("Неизвестный голос", voice="missing.wav")
+            bad_language = await client.synthesize_chunk("Unknown language", language="xx")
+            after_validation = server.requests
+            result = await client.synthesize_chunk("Первый настоящий запрос.")
+            model = client.server_model
+        logger.info(f"📊 Вход за {entered:.2f}с, пробных синтезов: {primed}, ошибка голоса: {unknown.error}")
+        return (
+            entered >= 0.4 and primed == 2
+            and not unknown.ok and not bad_language.ok and after_validation == primed
+            and result.ok and model == server.model
+        )
+    finally:
+        loader.cancel()
+        os.remove(config_file)
+        await server.stop()
+
+
+async def test_warmup_failures():
+    """Отмена прогрева закрывает сессию и проверку здоровья, ответ голосов не того вида не роняет вход"""
+    servers = [await FakeAllTalkServer().start() for _ in range(2)]
+    for server in servers:
+        server.ready = False
+    config_file = write_config([server.url for server in servers], warmup_on_enter=True, warmup_ready_timeout=5)
+
+    async def voices_list(request):
+        return web.json_response(["Arnold.wav"])
+
+    odd = FakeAllTalkServer(per_char_latency=0.001)
+    odd._voices = voices_list
+    await odd.start()
+    odd_config = write_config([odd.url], warmup_on_enter=True, warmup_ready_timeout=1)
+    try:
+        client = TTSStreamingClient(config_file)
+        entering = asyncio.ensure_future(client.__aenter__())
+        await asyncio.sleep(0.3)
+        entering.cancel()
+        try:
+            await entering
+            cancelled = False
+        except asyncio.CancelledError:
+            cancelled = True
+        cleaned = client.session is None and client.pool._checker is None
+
+        async with TTSStreamingClient(odd_config) as odd_client:
+            info = odd_client.server_info
+            result = await odd_client.synthesize_chunk("Голоса не загрузились, синтез работает.")
+        logger.info(f"📊 Отмена: {cancelled}, очищено: {cleaned}, голоса: {info}")
+        return cancelled and cleaned and info is None and result.ok
+    finally:
+        os.remove(config_file)
+        os.remove(odd_config)
+        for server in servers + [odd]:
+            await server.stop()
+
+
+async def test_lightweight_import():
+    """import client не трогает логирование и не грузит aiohttp, конфигурация кэшируется и не создается"""
+    probe = (
+        "import logging, sys; import client; "
+        "print(type(sys.modules['aiohttp']).__name__, 'requests' in sys.modules, len(logging.getLogger().handlers))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+
+    directory = tempfile.mkdtemp()
+    missing = os.path.join(directory, "tts_config.json")
+    defaults = TTSConfig(missing)
+    created = os.path.exists(missing)
+
+    config_file = write_config(["http://127.0.0.1:1"], default_voice="female_01.wav")
+    try:
+        first = TTSConfig(config_file)
+        second = TTSConfig(config_file)
+        second.config["default_voice"] = "changed.wav"
+        unchanged = first.reload()
+        with open(config_file, "r+", encoding="utf-8") as f:
+            data = json.load(f)
+            data["default_voice"] = "male_01.wav"
+            f.seek(0)
+            json.dump(data, f)
+            f.truncate()
+        os.utime(config_file, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        reloaded = first.reload()
+        logger.info(f"📊 Импорт: {output}, файл создан: {created}, перечитан: {reloaded}")
+        return (
+            output == ["_LazyModule", "False", "0"]
+            and not created and defaults.config["default_voice"] == "Arnold.wav"
+            and first.config is not second.config
+            and not unchanged and reloaded and first.config["default_voice"] == "male_01.wav"
+        )
+    finally:
+        os.remove(config_file)
+
+
+async def main():
+    """Запуск всех тестов пула"""
+    tests = [
+        ("Маршрутизация по нагрузке", test_least_outstanding_routing),
+        ("Исключение и возврат сервера", test_ejection_and_recovery),
+        ("Масштабирование пропускной способности", test_throughput_scaling),
+        ("Повторы и крайний срок", test_retries_and_deadline),
+        ("Хеджирование запросов", test_hedged_requests),
+        ("Прогрев и общая сессия", test_prewarm_and_shared_session),
+        ("Ожидание соединения в пуле", test_pool_wait_not_connect_timeout),
+        ("Синхронный клиент из многих потоков", test_sync_client_threads),
+        ("Объединение одинаковых запросов", test_request_coalescing),
+        ("Окно и приоритет общего запроса", test_coalesced_stream_bounds),
+        ("Нарезка потока токенов", test_segmenter_limits),
+        ("Дисковый кэш аудио", test_audio_cache_disk),
+        ("Адаптивный размер чанков", test_adaptive_chunk_sizes),
+        ("Приоритеты и допуск запросов", test_priority_scheduler),
+        ("Перебивание и остановка генерации", test_barge_in),
+        ("Остановка не задевает другие клиенты", test_stop_spares_other_clients),
+        ("Трассировка чанков", test_chunk_tracing),
+        ("Пауза в токенах не режет слова", test_iterator_stall_keeps_words),
+        ("Пакетный синтез с продолжением", test_batch_resume),
+        ("Пакетный синтез: пустые документы и ошибки файлов", test_batch_bad_documents),
+        ("Нормализация текста", test_text_normalization),
+        ("Прогрев при старте", test_startup_warmup),
+        ("Прогрев: отмена и ответ не того вида", test_warmup_failures),
+        ("Легкий импорт и кэш конфигурации", test_lightweight_import),
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test_name, test_func in tests:
+        try:
+            logger.info(f"\n🧪 {test_name}")
+            logger.info("-" * 30)
+
+            success = await test_func()
+            if success:
+                passed += 1
+                logger.info(f"✅ {test_name} - УСПЕХ")
+            else:
+                failed += 1
+                logger.error(f"❌ {test_name} - ПРОВАЛ")
+
+        except Exception as e:
+            failed += 1
+            logger.error(f"💥 {test_name} - ОШИБКА: {e}")
+
+    logger.info(f"\n" + "=" * 50)
+    logger.info(f"📊 ИТОГИ: {passed} успех, {failed} провал")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(main()) else 1)
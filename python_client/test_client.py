@@ -6,8 +6,10 @@
 
 import asyncio
 import logging
+import os
 import time
 from client import TTSStreamingClient
+from wav import WavAssembler
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -87,19 +89,31 @@ async def test_streaming_generation():
         start_time = time.time()
         first_chunk_time = None
         
-        async for audio_chunk in client.generate_tts_from_text(
-            text.strip(), 
-            max_chunk_size=60
-        ):
-            if audio_chunk:
-                chunks_count += 1
-                total_size += len(audio_chunk)
-                
-                if first_chunk_time is None:
-                    first_chunk_time = time.time() - start_time
-                    logger.info(f"🎯 Первый чанк за: {first_chunk_time:.2f}с")
-                
-                logger.info(f"📦 Чанк {chunks_count}: {len(audio_chunk)} байт")
+        # Сохраняем всё аудио в один файл с единственным WAV заголовком;
+        # пишем во временный файл, чтобы без ответа сервера не затереть
+        # прежний streaming_output.wav
+        part_path = "streaming_output.wav.part"
+        try:
+            with WavAssembler(part_path) as assembler:
+                async for audio_chunk in client.generate_tts_from_text(
+                    text.strip(), 
+                    max_chunk_size=60
+                ):
+                    if audio_chunk:
+                        chunks_count += 1
+                        total_size += len(audio_chunk)
+                        assembler.add_chunk(audio_chunk)
+                        
+                        if first_chunk_time is None:
+                            first_chunk_time = time.time() - start_time
+                            logger.info(f"🎯 Первый чанк за: {first_chunk_time:.2f}с")
+                        
+                        logger.info(f"📦 Чанк {chunks_count}: {len(audio_chunk)} байт")
+            if chunks_count > 0:
+                os.replace(part_path, "streaming_output.wav")
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
         
         total_time = time.time() - start_time
         
@@ -109,16 +123,7 @@ async def test_streaming_generation():
         logger.info(f"   ⏰ Время: {total_time:.2f}с")
         
         if chunks_count > 0:
-            # Сохраняем всё аудио в один файл
-            all_audio = b""
-            async for audio_chunk in client.generate_tts_from_text(text.strip(), max_chunk_size=60):
-                if audio_chunk:
-                    all_audio += audio_chunk
-            
-            if all_audio:
-                with open("streaming_output.wav", "wb") as f:
-                    f.write(all_audio)
-                logger.info("💾 Объединенное аудио сохранено в streaming_output.wav")
+            logger.info(f"💾 Объединенное аудио ({assembler.duration:.1f}с) сохранено в streaming_output.wav")
         
         return chunks_count > 0
 
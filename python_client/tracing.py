@@ -0,0 +1,264 @@
+"""
+Трассировка чанков: время в очереди, соединение, первый байт, передача,
+объем аудио и текста по каждому запросу к серверу
+
+Приемник подключается к клиенту параметром trace_sink. По умолчанию
+стоит NullSink: клиент не создает спаны и не вешает трассировку на сессию.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from lazy import lazy_import
+
+aiohttp = lazy_import("aiohttp")
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм длительностей, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PHASES = ("queue_wait", "connect", "ttfb", "transfer", "total")
+
+
+class ChunkSpan:
+    """
+    Замеры одного запроса чанка
+
+    Фазы, секунды: queue_wait - ожидание в планировщике и в пуле соединений,
+    connect - установка нового TCP соединения (0 при keep-alive),
+    ttfb - от отправки запроса до заголовков ответа,
+    transfer - от заголовков до последнего байта, total - весь запрос.
+    """
+
+    __slots__ = (
+        "chars", "voice", "language", "priority", "tenant", "streaming",
+        "backend", "status", "error", "cached", "bytes", "start_time",
+        "queue_wait", "connect", "ttfb", "transfer", "total",
+        "_started", "_admitted", "_headers", "_pool_wait", "_mark",
+    )
+
+    def __init__(self, chars: int, voice: str, language: str, priority: str, tenant: Optional[str], streaming: bool):
+        self.chars = chars
+        self.voice = voice
+        self.language = language
+        self.priority = priority
+        self.tenant = tenant
+        self.streaming = streaming
+        self.backend: Optional[str] = None
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.cached = False
+        self.bytes = 0
+        self.start_time = time.time()
+        self.queue_wait = 0.0
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.transfer = 0.0
+        self.total = 0.0
+        self._started = time.perf_counter()
+        self._admitted = self._started
+        self._headers: Optional[float] = None
+        # Ожидание свободного соединения в пуле aiohttp (из TraceConfig)
+        self._pool_wait = 0.0
+        self._mark = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and (self.cached or self.status == 200)
+
+    def admitted(self) -> None:
+        """Планировщик выдал слот - дальше время запроса к серверу"""
+        self._admitted = time.perf_counter()
+        self.queue_wait = self._admitted - self._started
+
+    def headers(self, backend: str, status: int) -> None:
+        """Пришли заголовки ответа"""
+        self._headers = time.perf_counter()
+        self.backend = backend
+        self.status = status
+        # Ожидание пула и установка соединения не относятся к ответу сервера
+        self.ttfb = max(0.0, self._headers - self._admitted - self._pool_wait - self.connect)
+
+    def finish(self, size: int = 0, error: Optional[str] = None) -> None:
+        """Запрос завершен: последний байт получен или запрос оборван"""
+        now = time.perf_counter()
+        self.bytes = size
+        self.error = error
+        self.queue_wait += self._pool_wait
+        if self._headers is not None:
+            self.transfer = now - self._headers
+        self.total = now - self._started
+
+    @classmethod
+    def from_cache(cls, chars: int, voice: str, language: str, priority: str, tenant: Optional[str], size: int) -> "ChunkSpan":
+        """Спан ответа из локального кэша: фаз нет, только объем"""
+        span = cls(chars, voice, language, priority, tenant, streaming=False)
+        span.cached = True
+        span.finish(size)
+        return span
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+
+    def __repr__(self) -> str:
+        return (
+            f"ChunkSpan(chars={self.chars}, backend={self.backend!r}, status={self.status}, "
+            f"ttfb={self.ttfb:.3f}, total={self.total:.3f})"
+        )
+
+
+class NullSink:
+    """Приемник по умолчанию: трассировка выключена"""
+
+    enabled = False
+
+    def record(self, span: ChunkSpan) -> None:
+        pass
+
+
+class CallbackSink:
+    """
+    Передает каждый завершенный спан в функцию - например, чтобы
+    превратить его в span OpenTelemetry с атрибутами из span.as_dict()
+    """
+
+    enabled = True
+
+    def __init__(self, callback: Callable[[ChunkSpan], None]):
+        self.callback = callback
+
+    def record(self, span: ChunkSpan) -> None:
+        try:
+            self.callback(span)
+        except Exception as e:
+            # Ошибка обработчика метрик не должна ломать синтез
+            logger.warning(f"⚠️ Ошибка приемника трассировки: {e}")
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class PrometheusSink:
+    """
+    Копит счетчики и гистограммы фаз и отдает их в текстовом формате
+    Prometheus через render() - его можно вернуть из обработчика /metrics
+    """
+
+    enabled = True
+
+    def __init__(self, prefix: str = "tts", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        # Запись идет из цикла событий, render() может звать другой поток
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        self._bytes: Dict[Tuple[str, str], int] = {}
+        self._chars: Dict[Tuple[str, str], int] = {}
+        self._phases: Dict[Tuple[str, str, str], _Histogram] = {}
+
+    def record(self, span: ChunkSpan) -> None:
+        backend = "cache" if span.cached else (span.backend or "")
+        if span.cached:
+            outcome = "cached"
+        elif span.ok:
+            outcome = "ok"
+        else:
+            outcome = "error"
+        with self._lock:
+            key = (backend, span.priority, outcome)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if span.cached:
+                return
+            short = (backend, span.priority)
+            self._bytes[short] = self._bytes.get(short, 0) + span.bytes
+            self._chars[short] = self._chars.get(short, 0) + span.chars
+            for phase in PHASES:
+                self._observe((backend, span.priority, phase), getattr(span, phase))
+
+    def _observe(self, key: Tuple[str, str, str], value: float) -> None:
+        histogram = self._phases.get(key)
+        if histogram is None:
+            histogram = self._phases[key] = _Histogram(len(self.buckets))
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            histogram.counts[index] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+    def render(self) -> str:
+        """Текущие метрики в формате Prometheus text exposition 0.0.4"""
+        p = self.prefix
+        lines: List[str] = []
+        with self._lock:
+            lines.append(f"# HELP {p}_chunk_requests_total Запросы чанков по серверу, приоритету и исходу")
+            lines.append(f"# TYPE {p}_chunk_requests_total counter")
+            for (backend, priority, outcome), value in sorted(self._requests.items()):
+                lines.append(
+                    f'{p}_chunk_requests_total{{backend="{backend}",priority="{priority}",outcome="{outcome}"}} {value}'
+                )
+            for name, values, help_text in (
+                ("chunk_bytes_total", self._bytes, "Получено байт аудио"),
+                ("chunk_chars_total", self._chars, "Отправлено символов текста"),
+            ):
+                lines.append(f"# HELP {p}_{name} {help_text}")
+                lines.append(f"# TYPE {p}_{name} counter")
+                for (backend, priority), value in sorted(values.items()):
+                    lines.append(f'{p}_{name}{{backend="{backend}",priority="{priority}"}} {value}')
+
+            lines.append(f"# HELP {p}_chunk_phase_seconds Длительность фаз запроса чанка")
+            lines.append(f"# TYPE {p}_chunk_phase_seconds histogram")
+            for (backend, priority, phase), histogram in sorted(self._phases.items()):
+                labels = f'backend="{backend}",priority="{priority}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{p}_chunk_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{p}_chunk_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{p}_chunk_phase_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{p}_chunk_phase_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def trace_config() -> "aiohttp.TraceConfig":
+    """
+    TraceConfig aiohttp, который дописывает в спан ожидание пула
+    соединений и время установки TCP соединения
+
+    Спан передается в запрос через trace_request_ctx.
+    """
+
+    async def queued_start(session, context, params):
+        span = context.trace_request_ctx
+        if isinstance(span, ChunkSpan):
+            span._mark = time.perf_counter()
+
+    async def queued_end(session, context, params):
+        span = context.trace_request_ctx
+        if isinstance(span, ChunkSpan):
+            span._pool_wait += time.perf_counter() - span._mark
+
+    async def create_start(session, context, params):
+        span = context.trace_request_ctx
+        if isinstance(span, ChunkSpan):
+            span._mark = time.perf_counter()
+
+    async def create_end(session, context, params):
+        span = context.trace_request_ctx
+        if isinstance(span, ChunkSpan):
+            span.connect = time.perf_counter() - span._mark
+
+    config = aiohttp.TraceConfig()
+    config.on_connection_queued_start.append(queued_start)
+    config.on_connection_queued_end.append(queued_end)
+    config.on_connection_create_start.append(create_start)
+    config.on_connection_create_end.append(create_end)
+    return config
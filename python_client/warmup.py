@@ -0,0 +1,110 @@
+"""
+Прогрев клиента при старте: ожидание готовности сервера, загрузка голосов
+и настроек в память и пробный синтез каждым голосом, чтобы первый
+настоящий запрос не платил за загрузку модели и голоса
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from lazy import lazy_import
+
+aiohttp = lazy_import("aiohttp")
+
+logger = logging.getLogger(__name__)
+
+# Языки XTTS v2 - основного движка AllTalk с поддержкой нескольких языков
+XTTS_LANGUAGES = frozenset({
+    "ar", "cs", "de", "en", "es", "fr", "hi", "hu", "it", "ja",
+    "ko", "nl", "pl", "pt", "ru", "tr", "zh-cn",
+})
+
+
+class ServerInfo:
+    """Голоса и настройки сервера, загруженные при прогреве"""
+
+    def __init__(self, voices: List[str], settings: Dict[str, Any]):
+        self.voices = frozenset(voices)
+        self.settings = settings
+        self.fetched_at = time.time()
+
+    @property
+    def model(self) -> str:
+        return self.settings.get("current_model_loaded") or ""
+
+    @property
+    def engine(self) -> str:
+        return self.settings.get("current_engine_loaded") or ""
+
+    def validate(self, voice: str, language: str) -> Optional[str]:
+        """
+        Проверяет голос и язык без обращения к серверу
+
+        Returns:
+            Описание ошибки или None, если запрос допустим
+        """
+        if self.voices and voice not in self.voices:
+            return f"голос {voice!r} отсутствует на сервере"
+        # Список языков сервер не отдает; проверяем только для XTTS
+        if self.engine == "xtts" and self.settings.get("languages_capable") and language not in XTTS_LANGUAGES:
+            return f"язык {language!r} не поддерживается движком {self.engine}"
+        return None
+
+    def __repr__(self) -> str:
+        return f"ServerInfo(model={self.model!r}, voices={len(self.voices)})"
+
+
+async def wait_ready(
+    session: "aiohttp.ClientSession",
+    url: str,
+    timeout: float,
+    initial_delay: float = 0.25,
+    max_delay: float = 5.0
+) -> bool:
+    """
+    Опрашивает /api/ready с экспоненциальной задержкой, пока сервер не
+    ответит Ready (загрузка модели занимает до полуминуты)
+
+    Returns:
+        True, если сервер готов до истечения timeout
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            async with session.get(f"{url}/api/ready") as response:
+                if response.status == 200 and (await response.text()).strip().strip('"') == "Ready":
+                    return True
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        logger.info(f"⏳ Сервер {url} еще не готов, повтор через {min(delay, remaining):.2f}с")
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+async def fetch_server_info(session: "aiohttp.ClientSession", url: str) -> ServerInfo:
+    """
+    Загружает /api/voices и /api/currentsettings
+
+    Raises:
+        aiohttp.ClientError: если сервер не ответил
+        ValueError: если ответ не JSON или не того вида
+    """
+    async def get_json(path: str) -> Dict[str, Any]:
+        async with session.get(f"{url}{path}") as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        if not isinstance(body, dict):
+            raise ValueError(f"{path}: ожидался объект JSON, получен {type(body).__name__}")
+        return body
+
+    voices, settings = await asyncio.gather(get_json("/api/voices"), get_json("/api/currentsettings"))
+    names = voices.get("voices") or []
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("/api/voices: поле voices должно быть списком строк")
+    return ServerInfo(names, settings)
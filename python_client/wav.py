@@ -0,0 +1,230 @@
+"""
+Склейка WAV чанков в один файл с единственным корректным заголовком
+Каждый ответ сервера - отдельный WAV, поэтому простая конкатенация дает
+файл с заголовками посреди аудио
+"""
+
+import struct
+from typing import BinaryIO, Optional, Union
+
+# Размер данных, который ставят потоковые генераторы, не знающие длину заранее
+_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+
+
+class WavFormat:
+    """Формат аудио из чанка fmt"""
+
+    def __init__(self, fmt_body: bytes):
+        if len(fmt_body) < 16:
+            raise ValueError("Слишком короткий чанк fmt")
+        self.body = bytes(fmt_body)
+        (self.format_tag, self.channels, self.sample_rate,
+         self.byte_rate, self.block_align, self.bits_per_sample) = struct.unpack_from("<HHIIHH", fmt_body)
+
+    def same_stream(self, other: "WavFormat") -> bool:
+        return (self.format_tag, self.channels, self.sample_rate, self.bits_per_sample) == (
+            other.format_tag, other.channels, other.sample_rate, other.bits_per_sample
+        )
+
+
+def parse_header(data) -> Optional[tuple]:
+    """
+    Разбирает заголовок WAV
+
+    Returns:
+        (WavFormat, смещение PCM данных, размер данных или None, если неизвестен)
+        или None, если заголовок еще не пришел целиком
+
+    Raises:
+        ValueError: если это не WAV
+    """
+    view = memoryview(data)
+    if len(view) < 12:
+        return None
+    if bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Ожидался заголовок RIFF/WAVE")
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        size = struct.unpack_from("<I", view, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("Чанк data раньше чанка fmt")
+            return fmt, body, None if size in _UNKNOWN_SIZES else size
+        if body + size > len(view):
+            return None
+        if chunk_id == b"fmt ":
+            fmt = WavFormat(view[body:body + size])
+        # Чанки RIFF выравниваются на четную границу
+        offset = body + size + (size & 1)
+    return None
+
+
+def wav_duration(data) -> float:
+    """Длительность WAV в секундах по заголовку и фактической длине данных"""
+    header = parse_header(data)
+    if header is None:
+        return 0.0
+    fmt, offset, size = header
+    available = len(data) - offset
+    size = available if size is None else min(size, available)
+    return size / fmt.byte_rate if fmt.byte_rate else 0.0
+
+
+class WavAssembler:
+    """
+    Пишет PCM из последовательности WAV чанков в один файл
+
+    Заголовок каждого чанка разбирается один раз, данные пишутся в цель
+    срезами memoryview без промежуточных склеек, а в конце в начало файла
+    записывается единственный заголовок с итоговыми размерами. В памяти
+    держится только недочитанный заголовок текущего чанка.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO]):
+        """
+        Args:
+            target: Путь к файлу или двоичный файловый объект с поддержкой seek
+        """
+        if isinstance(target, str):
+            self._out = open(target, "wb")
+            self._owns_output = True
+        else:
+            if not target.seekable():
+                raise ValueError("WavAssembler нужен файл с поддержкой seek")
+            self._out = target
+            self._owns_output = False
+        self._start = self._out.tell()
+        self.format: Optional[WavFormat] = None
+        self.data_bytes = 0
+        self.chunks = 0
+        self.closed = False
+        # Состояние разбора текущего чанка
+        # _remaining: сколько PCM осталось в чанке (None - до конца потока,
+        # 0 - ждем заголовок следующего чанка)
+        self._header = bytearray()
+        self._in_header = False
+        self._remaining: Optional[int] = 0
+
+    def __enter__(self) -> "WavAssembler":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @property
+    def duration(self) -> float:
+        """Длительность записанного аудио в секундах"""
+        if self.format is None or not self.format.byte_rate:
+            return 0.0
+        return self.data_bytes / self.format.byte_rate
+
+    def add_chunk(self, data) -> None:
+        """Добавляет целый WAV чанк"""
+        self.start_chunk()
+        self.feed(data)
+
+    def start_chunk(self) -> None:
+        """Следующие байты начинают новый WAV чанк"""
+        self._header.clear()
+        self._in_header = True
+        self._remaining = None
+
+    def feed(self, data) -> None:
+        """
+        Добавляет очередной кусок потока
+
+        Кадры из stream_tts_chunk_iter можно подавать без start_chunk: кадр,
+        начинающийся с RIFF....WAVE после окончания данных (или когда сервер
+        не указал размер), считается началом нового чанка.
+        """
+        view = memoryview(data).cast("B")
+        while len(view):
+            if not self._in_header:
+                if self._remaining == 0:
+                    if self._looks_like_header(view, partial=True):
+                        self.start_chunk()
+                    elif self.chunks == 0:
+                        raise ValueError("Поток должен начинаться с WAV заголовка")
+                    else:
+                        # Хвост после объявленных данных (например, LIST) пропускаем
+                        return
+                elif self._remaining is None and self._looks_like_header(view):
+                    self.start_chunk()
+            if self._in_header:
+                view = self._consume_header(view)
+                continue
+            if self._remaining is None:
+                take = len(view)
+            else:
+                take = min(len(view), self._remaining)
+                self._remaining -= take
+            self._write_pcm(view[:take])
+            view = view[take:]
+
+    def close(self) -> None:
+        """Записывает итоговый заголовок и закрывает файл, если открывали его сами"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.format is not None:
+            if self.data_bytes & 1:
+                self._out.write(b"\x00")
+            end = self._out.tell()
+            self._out.seek(self._start)
+            self._out.write(self._build_header(self.data_bytes))
+            self._out.seek(end)
+        self._out.flush()
+        if self._owns_output:
+            self._out.close()
+
+    @staticmethod
+    def _looks_like_header(view: memoryview, partial: bool = False) -> bool:
+        if len(view) < 12:
+            # Сеть может отдать заголовок по частям
+            return partial and bytes(view[:4]) == b"RIFF"[:len(view[:4])]
+        return view[0:4] == b"RIFF" and view[8:12] == b"WAVE"
+
+    def _consume_header(self, view: memoryview) -> memoryview:
+        # Копим только байты заголовка небольшими порциями, PCM сюда не попадает
+        before = len(self._header)
+        consumed = 0
+        while True:
+            piece = view[consumed:consumed + 512]
+            if not len(piece):
+                return piece
+            self._header += piece
+            consumed += len(piece)
+            header = parse_header(self._header)
+            if header is not None:
+                break
+
+        fmt, offset, size = header
+        if self.format is None:
+            self.format = fmt
+            # Заголовок-заглушка, размеры будут исправлены в close()
+            self._out.write(self._build_header(0))
+        elif not fmt.same_stream(self.format):
+            raise ValueError("Формат аудио чанка отличается от предыдущих")
+        self.chunks += 1
+        self._in_header = False
+        self._remaining = size
+        self._header.clear()
+        # PCM начинается внутри текущего куска после заголовка
+        return view[offset - before:]
+
+    def _write_pcm(self, view: memoryview) -> None:
+        if len(view):
+            self._out.write(view)
+            self.data_bytes += len(view)
+
+    def _build_header(self, data_size: int) -> bytes:
+        fmt_body = self.format.body
+        riff_size = 4 + (8 + len(fmt_body)) + (8 + data_size + (data_size & 1))
+        return (
+            b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+            + b"fmt " + struct.pack("<I", len(fmt_body)) + fmt_body
+            + b"data" + struct.pack("<I", data_size)
+        )